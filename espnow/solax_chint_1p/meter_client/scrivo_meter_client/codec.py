@@ -0,0 +1,101 @@
+
+import struct
+
+# type: struct format, byte size, int range
+TYPES = {
+    "int16": ("h", 2, -0x8000, 0x7FFF),
+    "uint16": ("H", 2, 0, 0xFFFF),
+    "int32": ("i", 4, -0x80000000, 0x7FFFFFFF),
+    "uint32": ("I", 4, 0, 0xFFFFFFFF),
+    "float32": ("f", 4, None, None),
+}
+
+# legacy act "pack"/"unpack" format -> type
+_legacy = {"h": "int16", "H": "uint16", "i": "int32", "l": "int32", "I": "uint32", "L": "uint32", "f": "float32"}
+
+# byte order of registers for word/byte swapped 32 bit values
+_order = {"word": (2, 3, 0, 1), "byte": (1, 0, 3, 2)}
+
+
+class Codec:
+    # act: {"type": "float32", "swap": None|"word"|"byte"|"both", "scale": 1, "offset": 0,
+    #       "min": None, "max": None, "value": None, "unit": "W"}
+    # decode: register bytes -> raw * scale + offset
+    # encode: value * scale + offset -> register bytes
+
+    def __init__(self, act):
+        self.type = act.get("type", "int16")
+        fmt, self.size, self.type_lo, self.type_hi = TYPES[self.type]
+        self.scale = act.get("scale", 1)
+        self.offset = act.get("offset", 0)
+        self.value = act.get("value")
+        self.unit = act.get("unit")
+        self.is_int = self.type_lo is not None
+
+        # clamp of converted value
+        self.lo = act.get("min")
+        self.hi = act.get("max")
+
+        # fixed conversion path
+        swap = act.get("swap")
+        self.order = None
+        if swap == "both" or (swap == "byte" and self.size == 2):
+            self.fmt = "<" + fmt
+        else:
+            self.fmt = ">" + fmt
+            if swap in _order and self.size == 4:
+                self.order = _order[swap]
+        self._buf = bytearray(self.size)
+
+    def _swap(self, data):
+        buf = self._buf
+        for i, j in enumerate(self.order):
+            buf[i] = data[j]
+        return buf
+
+    def _convert(self, value):
+        value = value * self.scale + self.offset
+        if self.lo is not None and value < self.lo:
+            value = self.lo
+        if self.hi is not None and value > self.hi:
+            value = self.hi
+        return value
+
+    def decode(self, data):
+        if self.order is not None:
+            data = self._swap(data)
+        return self._convert(struct.unpack_from(self.fmt, data, 0)[0])
+
+    def encode(self, value=None):
+        if value is None:
+            value = self.value
+        value = self._convert(value)
+        if self.is_int:
+            # round and saturate to register type, inf saturates, nan as 0
+            if value != value:
+                value = 0
+            elif value >= self.type_hi:
+                value = self.type_hi
+            elif value <= self.type_lo:
+                value = self.type_lo
+            else:
+                value = int(round(value))
+
+        data = struct.pack(self.fmt, value)
+        if self.order is not None:
+            data = bytes(self._swap(data))
+        return data
+
+
+def compile_act(act):
+    # act dict from config -> Codec, accept legacy pack/unpack keys
+    if act is None:
+        return None
+
+    act = dict(act)
+    fmt = act.pop("pack", None) or act.pop("unpack", None)
+    if fmt is not None:
+        act["type"] = _legacy[fmt[-1]]
+        if fmt[0] == "<":
+            act["swap"] = "both"
+    return Codec(act)
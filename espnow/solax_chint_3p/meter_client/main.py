@@ -8,6 +8,8 @@ from scrivo import logging
 
 log = logging.getLogger('MAIN')
 logging.basicConfig(level=logging.INFO)
+# log lines go to ring buffer, written to console in idle time
+log_sink = logging.buffered(2048)
 
 
 storage_dir = "."
@@ -55,6 +57,7 @@ def main():
 
     # Run Loader Task
     loop.create_task(run_wdt())
+    loop.create_task(log_sink.drain())
     loop.create_task(loader())
 
 
@@ -0,0 +1,52 @@
+
+import time
+from array import array
+
+
+class UnitHealth:
+    # response latency of one meter unit and circuit breaker
+    # timeout: p99 of recent latencies + margin, fail_max failures in a row: open, probe with back-off
+
+    def __init__(self, margin_ms=50, max_ms=1000, fail_max=3, backoff_ms=1000, backoff_max_ms=60000, size=32):
+        self.margin_ms = margin_ms
+        self.max_ms = max_ms
+        self.fail_max = fail_max
+        self.backoff_ms = backoff_ms
+        self.backoff_max_ms = backoff_max_ms
+
+        self.samples = array("H", [0] * size)
+        self.n = 0
+        self.i = 0
+        self.timeout = max_ms
+
+        self.fails = 0
+        self.open = False
+        self.backoff = 0
+        self.probe_at = 0
+
+    def ok(self, latency):
+        # True if breaker closed again
+        samples = self.samples
+        samples[self.i] = min(latency, 0xFFFF)
+        self.i = (self.i + 1) % len(samples)
+        if self.n < len(samples):
+            self.n += 1
+        if self.n >= 4:
+            p99 = sorted(samples[:self.n])[(99 * self.n + 99) // 100 - 1]
+            self.timeout = min(p99 + self.margin_ms, self.max_ms)
+
+        closed = self.open
+        self.fails = 0
+        self.open = False
+        self.backoff = 0
+        return closed
+
+    def fail(self, now):
+        # True if breaker open, next probe at probe_at
+        self.fails += 1
+        if self.fails < self.fail_max:
+            return False
+        self.backoff = min(2 * self.backoff, self.backoff_max_ms) if self.backoff else self.backoff_ms
+        self.open = True
+        self.probe_at = time.ticks_add(now, self.backoff)
+        return True
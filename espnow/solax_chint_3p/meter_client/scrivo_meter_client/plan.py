@@ -0,0 +1,61 @@
+
+from scrivo.tools.tool import DataClassArg
+
+# FC03/FC04 limit of registers in one read
+MAX_QTY = 125
+
+
+def plan_blocks(requests, max_gap=0, max_qty=MAX_QTY):
+    # merge requests on same unit and func with near register ranges into one read
+    blocks = []
+    for request in sorted(requests, key=lambda r: (r.addr, r.func, r.start_reg)):
+        block = blocks[-1] if blocks else None
+        end = request.start_reg + request.qty_reg
+
+        if (block is not None and request.func in (0x03, 0x04)
+                and block.addr == request.addr and block.func == request.func
+                and request.start_reg <= block.start_reg + block.qty_reg + max_gap
+                and end - block.start_reg <= max_qty):
+            block.qty_reg = max(block.qty_reg, end - block.start_reg)
+            block.members.append(request)
+        else:
+            blocks.append(DataClassArg(
+                addr=request.addr,
+                func=request.func,
+                start_reg=request.start_reg,
+                qty_reg=request.qty_reg,
+                members=[request],
+            ))
+    return blocks
+
+
+def learn_requests(requests, demand, min_ms=100):
+    # requests read by the consumer, polled at its read rate
+    # demand: {offset: interval ms, 0 rate unknown}, empty: nothing learned, poll all as configured
+    if not demand:
+        for request in requests:
+            request.interval = request.base_interval
+        return list(requests)
+
+    used = []
+    for request in requests:
+        interval = demand.get(request.offset)
+        if interval is None:
+            continue
+        if interval:
+            # 50 ms steps against jitter, value must stay fresh between polls
+            interval = (interval + 25) // 50 * 50
+            request.interval = min(max(interval, min_ms), request.fresh.max_age // 2)
+        else:
+            request.interval = request.base_interval
+        used.append(request)
+    return used
+
+
+def member_slice(block, request):
+    # byte range of request registers in block response frame
+    if block.func in (0x01, 0x02):
+        # bit packed, never merged
+        return 3, block.resp_len - 2
+    start = 3 + 2 * (request.start_reg - block.start_reg)
+    return start, start + 2 * request.qty_reg
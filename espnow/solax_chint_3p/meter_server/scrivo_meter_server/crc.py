@@ -1,7 +1,7 @@
 
-import struct
+from array import array
 
-CRC16_TABLE = (
+CRC16_TABLE = array('H', (
     0x0000, 0xC0C1, 0xC181, 0x0140, 0xC301, 0x03C0, 0x0280, 0xC241, 0xC601,
     0x06C0, 0x0780, 0xC741, 0x0500, 0xC5C1, 0xC481, 0x0440, 0xCC01, 0x0CC0,
     0x0D80, 0xCD41, 0x0F00, 0xCFC1, 0xCE81, 0x0E40, 0x0A00, 0xCAC1, 0xCB81,
@@ -31,26 +31,93 @@ CRC16_TABLE = (
     0x8F81, 0x4F40, 0x8D01, 0x4DC0, 0x4C80, 0x8C41, 0x4400, 0x84C1, 0x8581,
     0x4540, 0x8701, 0x47C0, 0x4680, 0x8641, 0x8201, 0x42C0, 0x4380, 0x8341,
     0x4100, 0x81C1, 0x8081, 0x4040
-)
+))
 
 CRC_LENGTH = 0x02
 
 
-def check_crc16(data):
-    req_crc = data[-CRC_LENGTH:]
-    req_data = data[:-CRC_LENGTH]
-    crc = calc_crc16(req_data)
-    if (req_crc[0] != crc[0]) or (req_crc[1] != crc[1]):
-        return None, None
-    return crc, req_data
+def _crc16_py(data, start, end):
+    table = CRC16_TABLE
+    crc = 0xFFFF
+    for i in range(start, end):
+        crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+    return crc
+
+
+_variants = [("python", _crc16_py)]
+crc16 = _crc16_py
+
+# MicroPython: native and viper code, host python use pure fallback
+try:
+    import micropython
+
+    @micropython.native
+    def _crc16_native(data, start, end):
+        table = CRC16_TABLE
+        crc = 0xFFFF
+        for i in range(start, end):
+            crc = (crc >> 8) ^ table[(crc ^ data[i]) & 0xFF]
+        return crc
+
+    @micropython.viper
+    def _crc16_viper(data, start: int, end: int) -> int:
+        buf = ptr8(data)
+        table = ptr16(CRC16_TABLE)
+        crc = 0xFFFF
+        i = start
+        while i < end:
+            crc = (crc >> 8) ^ table[(crc ^ buf[i]) & 0xFF]
+            i += 1
+        return crc
+
+    _variants.append(("native", _crc16_native))
+    _variants.append(("viper", _crc16_viper))
+    crc16 = _crc16_viper
+except ImportError:
+    pass
+
+
+def check_crc16(data, start=0, end=None):
+    # crc is last 2 bytes of data[start:end], little endian, no slice copy
+    if end is None:
+        end = len(data)
+    end -= CRC_LENGTH
+    if end <= start:
+        return False
+    crc = crc16(data, start, end)
+    return data[end] == crc & 0xFF and data[end + 1] == crc >> 8
+
+
+def put_crc16(buf, end, start=0):
+    # write crc of buf[start:end] to buf[end:end+2], return frame length
+    crc = crc16(buf, start, end)
+    buf[end] = crc & 0xFF
+    buf[end + 1] = crc >> 8
+    return end + CRC_LENGTH
 
 
 def calc_crc16(data):
-    crc = 0xFFFF
-    for char in data:
-        crc = (crc >> 8) ^ CRC16_TABLE[(crc ^ char) & 0xFF]
-    crc = struct.pack('<H', crc)
-    return crc
+    crc = crc16(data, 0, len(data))
+    return bytes((crc & 0xFF, crc >> 8))
 
 
+def bench(n=1000):
+    import time
+    try:
+        ticks_us = time.ticks_us
+        ticks_diff = time.ticks_diff
+    except AttributeError:
+        ticks_us = lambda: time.perf_counter_ns() // 1000
+        ticks_diff = lambda a, b: a - b
 
+    frames = (bytearray(range(8)), bytearray(range(256)))
+    for frame in frames:
+        mv = memoryview(frame)
+        ref = _crc16_py(mv, 0, len(mv))
+        for name, func in _variants:
+            assert func(mv, 0, len(mv)) == ref, name
+            start = ticks_us()
+            for _ in range(n):
+                func(mv, 0, len(mv))
+            diff = ticks_diff(ticks_us(), start)
+            print("crc16 {:>7}: {:>3} bytes {:>9.2f} us".format(name, len(mv), diff / n))
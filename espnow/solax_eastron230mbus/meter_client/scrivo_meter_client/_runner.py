@@ -1,3 +1,4 @@
+import os
 import time
 import struct
 import binascii
@@ -6,19 +7,72 @@ import aioespnow
 from scrivo.tools.tool import launch, asyncio, DataClassArg
 from machine import UART
 
-from .crc import check_crc16, calc_crc16
+from .crc import check_crc16, put_crc16
+from .rtu import RtuFramer, response_len, EXC_LEN
+from .plan import plan_blocks, member_slice, learn_requests
+from .fresh import Fresh, MAX_AGE
+from .sched import PollScheduler, INTERVAL, PRIORITY
+from .demand import unpack_demand, unpack_trigger
+from .health import UnitHealth
+from .codec import compile_act
+from .link import pack_head, pack_record, record_len, unpack_ack, AckWindow, HEAD_LEN, CRC_LEN, ESPNOW_MAX, RECORD_MAX, BUCKETS
 
 from scrivo import logging
 log = logging.getLogger("MODBUS")
 log.setLevel(logging.DEBUG)
+# link down: summary of repeated errors, cap console lines per second
+log.suppress(10)
+log.limit(50, 100)
+
+reg_code = {
+    0x01: 0,
+    0x02: 10001,
+    0x03: 40001,
+    0x04: 30001,
+}
 
-def hexh(data,  sep=' '):
-    try:
-        data = f'{sep}'.join('{:02x}'.format(x) for x in data)
-    except Exception as e:
-        log.debug("error: HEX: {}".format(e))
-    return data
+class _Hex:
+    # lazy hex dump, joined only when the log line is emitted
+
+    def __init__(self, data, sep):
+        self.data = data
+        self.sep = sep
 
+    def __str__(self):
+        try:
+            return self.sep.join('{:02x}'.format(x) for x in self.data)
+        except Exception as e:
+            return "error: HEX: {}".format(e)
+
+
+def hexh(data,  sep=' '):
+    return _Hex(data, sep)
+
+
+# meter response timeout: p99 of unit latency + meter_margin_ms, at most meter_timeout_ms
+meter_timeout_ms = 1000
+meter_margin_ms = 50
+# meter_fail_max failures in a row: unit skipped, probed after meter_backoff_ms, doubled up to meter_backoff_max_ms
+meter_fail_max = 3
+meter_backoff_ms = 1000
+meter_backoff_max_ms = 60000
+
+# merge polls on same unit/func if gap between ranges <= poll_max_gap registers
+poll_max_gap = 10
+# log realised poll rates every poll_report_ms
+poll_report_ms = 60000
+# server demand (registers read by inverter, read rate) older than demand_ttl_ms: poll all as configured
+demand_ttl_ms = 100000
+# fastest learned poll interval, ms
+poll_min_ms = 100
+# values are sent on change only, unchanged fresh values every heartbeat_ms as keep-alive
+# keep below server "max_age"
+heartbeat_ms = 2000
+# messages in flight until acked by server, sends per message at most 1 + ack_retries
+ack_window = 8
+ack_retries = 3
+# log delivery stats every link_report_ms
+link_report_ms = 60000
 
 data_register_master = {
 
@@ -27,7 +81,14 @@ data_register_master = {
         "func": 3,
         "start_reg": 8192,
         "qty_reg": 6,
-        "alive": 10000, # 10000 for test - for real devices set: 0
+        "max_age": 5000,  # ms value is sent after meter update
+        "interval": 250,  # ms target poll interval
+        "priority": 1,    # due polls with higher priority go first
+        # send on any register change, or only if value at register "reg" moved by "delta":
+        # {"type": "float32", "reg": 0, "delta": 5}
+        "deadband": None,
+        # value type on air: int16, uint16, int32, uint32, float32; None: register data as is
+        "type": None,
         "raw": bytearray(b'\x02\x03\x05\x07'),
         "peer": b'\x29\x6F\x27\x04\x80\x64'  # server MAC address
     }
@@ -51,104 +112,346 @@ class Runner:
         self.e_lan = aioespnow.AIOESPNow()
         self.e_lan.active(True)
 
-        self.request_data = []
-        for key, value in data_register_master.items():
-            self.request_data.append(DataClassArg(name=key, **value))
+        self.build_requests()
 
         self.meter_uart = UART(1, baudrate=9600, tx=13, rx=14)
         self.meter_swriter = asyncio.StreamWriter(self.meter_uart, {})
-        self.meter_sreader = asyncio.StreamReader(self.meter_uart)
+        self.meter_framer = RtuFramer(self.meter_uart, baudrate=9600, timer=0)
 
         launch(self.meter_process)
         launch(self.espnow_process)
+        launch(self.espnow_receiver)
+        launch(self.espnow_retransmit)
+
 
+    def build_requests(self):
+        # poll frames are static, build once; call again after config change
+        self.request_data = []
+        for key, value in data_register_master.items():
+            # one register range is one record, sent in one message
+            if record_len(2 * value["qty_reg"], value.get("type")) > RECORD_MAX:
+                log.error("%s: %s registers do not fit one espnow message", key, value["qty_reg"])
+                continue
+            request = DataClassArg(name=key, **value)
+            request.fresh = Fresh(value.get("max_age", MAX_AGE))
+            request.interval = value.get("interval", INTERVAL)
+            request.priority = value.get("priority", PRIORITY)
+            request.base_interval = request.interval
+            request.offset = reg_code[request.func] + request.start_reg
+            request.type = value.get("type")
+            self.request_data.append(request)
+
+        # latency and circuit breaker per meter unit
+        self.meter_health = {}
+        for request in self.request_data:
+            if request.addr not in self.meter_health:
+                self.meter_health[request.addr] = UnitHealth(
+                    meter_margin_ms, meter_timeout_ms, meter_fail_max, meter_backoff_ms, meter_backoff_max_ms)
+
+        self.demand_ticks = None
+        self.poll_plan = None
+        # parsed meter read waiting for espnow
+        self.send_event = asyncio.Event()
+        # new epoch every boot: server does not take new seqs for old ones
+        self.epoch = int.from_bytes(os.urandom(2), "big")
+        self.seq = 0
+        self.tx = bytearray(ESPNOW_MAX)
+        self.tx_mv = memoryview(self.tx)
+        self.acks = AckWindow(ack_window, ack_retries)
+        self.acks_event = asyncio.Event()
+        for request in self.request_data:
+            request.pending = False
+            request.sent = None
+            # last sent register data or deadband value
+            request.sent_data = None
+            request.sent_value = None
+            request.deadband_codec = compile_act(request.deadband) if getattr(request, "deadband", None) else None
+        self.plan_requests(self.request_data)
+
+    def plan_requests(self, requests):
+        # near register ranges polled as one block read
+        self.poll_blocks = plan_blocks(requests, poll_max_gap)
+        for block in self.poll_blocks:
+            # response size known from func and qty_reg
+            block.resp_len = response_len(block.func, block.qty_reg)
+            block.pdu = bytes(self.make_request(block))
+            # server trigger waiting for this block's read
+            block.triggered = False
+        self.poll_sched = PollScheduler(self.poll_blocks)
+        for block in self.poll_blocks:
+            if self.meter_health[block.addr].open:
+                self.poll_sched.align(block, self.meter_health[block.addr].probe_at)
+
+    def plan_learned(self, demand):
+        # poll only what the inverter reads, rebuild plan on change
+        requests = learn_requests(self.request_data, demand, poll_min_ms)
+        plan = [(request.name, request.interval) for request in requests]
+        if plan != self.poll_plan:
+            self.poll_plan = plan
+            log.info("Poll plan: %s", plan)
+            self.plan_requests(requests)
 
     def make_request(self, request):
         quantity = request.qty_reg
-        request_pdu = struct.pack('>BBHH', request.addr, request.func, request.start_reg, quantity)
+        modbus_pdu = bytearray(8)
+        struct.pack_into('>BBHH', modbus_pdu, 0, request.addr, request.func, request.start_reg, quantity)
         # debug
-        log.debug(f"  Pdu Reguest : {hexh(request_pdu)}")
+        log.debug("  Pdu Reguest : %s", hexh(modbus_pdu[:6]))
 
-        modbus_pdu = bytearray()
-        modbus_pdu.extend(request_pdu)
-        modbus_pdu.extend(calc_crc16(request_pdu))
+        put_crc16(modbus_pdu, 6)
         # debug
-        log.debug(f"  Pdu UART : {hexh(modbus_pdu)}")
+        log.debug("  Pdu UART : %s", hexh(modbus_pdu))
         log.debug(" ")
 
         return modbus_pdu
 
-    def parse_response(self, request, data):
-        log.debug(f"<<recv: {hexh(data)}")
-        if data[0] != request.addr or data[1] != request.func:
+    def parse_response(self, block, data):
+        log.debug("<<recv: %s", hexh(data))
+        if len(data) < EXC_LEN or data[0] != block.addr or data[1] != block.func:
             return None
 
-        crc, req_data = check_crc16(data)
-        if crc:
+        if check_crc16(data):
             unit_addr = data[0]
             func = data[1]
-            len_data = struct.unpack_from('B', data[2:3])[0]
-            raw_data = data[3:-2]
+            len_data = data[2]
 
-            log.debug(f"  addr: {unit_addr}, reg_addr: {func}={hex(func)}, len_data: {len_data}")
-            log.debug(f"  data: {hexh(raw_data)}")
-            log.debug(" ")
-            return True
+            log.debug("  addr: %s, reg_addr: %s=%s, len_data: %s", unit_addr, func, hex(func), len_data)
 
-    async def meter_process(self):
+            # split block response to request records: offset, type, register data
+            for request in block.members:
+                start, end = member_slice(block, request)
 
-        while True:
-            for request in self.request_data:
-                request.alive -= 1
-                uart_pdu = self.make_request(request)
-                if uart_pdu is not None:
-                    # send request to unit
-                    await self.meter_swriter.awrite(uart_pdu)
+                raw, request.value_at = pack_record(request.func, request.start_reg, data[start:end], request.type)
+
+                log.debug("  data: %s", hexh(raw))
+                request.fresh.touch()
+                request.raw = raw
+                # server waits for the read it triggered, unchanged too
+                request.pending = block.triggered or self.changed(request, data[start:end])
+            block.triggered = False
 
-                    await asyncio.sleep(0.2)
-                    data = b''
+            self.send_event.set()
 
-                    # wait for response and read it
-                    try:
-                        data = await asyncio.wait_for(self.meter_sreader.read_uart(-1), 1)
-                    except asyncio.TimeoutError:
-                        log.error('Meter got timeout')
-                    # log.info(f" << uart {'Meter'}: {hexh(data)}")
+            log.debug(" ")
+            return True
 
-                    if data != b'':
-                        # parse response data
-                        val_data = self.parse_response(request, data)
-                        if val_data is not None:
-                            request.value = val_data
-                            request.alive = 10
-                            request.raw = uart_pdu[0:4]+data # reguest addr, func, start_reg, qty_reg + response full.
-            await asyncio.sleep(0.1)
+    def changed(self, request, data):
+        # against last sent: any register change, with deadband only a value move of at least delta
+        codec = request.deadband_codec
+        if codec is not None:
+            i = 2 * request.deadband.get("reg", 0)
+            value = codec.decode(data[i:i + codec.size])
+            return request.sent_value is None or abs(value - request.sent_value) >= request.deadband["delta"]
+        return bytes(data) != request.sent_data
+
+    def mark_sent(self, request, now):
+        request.pending = False
+        request.sent = now
+        data = request.raw[request.value_at:]
+        codec = request.deadband_codec
+        if codec is not None:
+            j = 2 * request.deadband.get("reg", 0)
+            request.sent_value = codec.decode(data[j:j + codec.size])
+        else:
+            request.sent_data = bytes(data)
 
+    async def meter_process(self):
 
+        while True:
+            block = None
+            try:
+                # next due block by deadline and priority, else sleep to the nearest deadline
+                sched = self.poll_sched
+                block, wait = sched.next(time.ticks_ms())
+                if block is None:
+                    await sched.sleep(wait)
+                    continue
+
+                # send request to unit
+                health = self.meter_health[block.addr]
+                start = time.ticks_ms()
+                self.meter_framer.flush()
+                await self.meter_swriter.awrite(block.pdu)
+                sent = time.ticks_ms()
+
+                # wait for response: exactly resp_len bytes, or exception frame, unit timeout from its latency
+                data = await self.meter_framer.read(block.resp_len, health.timeout)
+                # log.info(f" << uart {'Meter'}: {hexh(data)}")
+
+                ok = False
+                if not len(data):
+                    log.error('Meter got timeout')
+                else:
+                    # parse response data
+                    ok = bool(self.parse_response(block, data))
+
+                now = time.ticks_ms()
+                sched.done(block, now, ok, time.ticks_diff(now, start))
+                self.meter_check(block.addr, health, len(data) and check_crc16(data), time.ticks_diff(now, sent), now)
+                if time.ticks_diff(now, sched.since) >= poll_report_ms:
+                    self.poll_report(now)
+                if self.demand_ticks is not None and time.ticks_diff(now, self.demand_ticks) > demand_ttl_ms:
+                    # server gone quiet
+                    self.demand_ticks = None
+                    self.plan_learned({})
+            except Exception as e:
+                log.error("METER: {}".format(e))
+                if block is not None:
+                    # failed poll, block keeps its cadence
+                    self.poll_sched.done(block, time.ticks_ms(), False)
+
+            # bus silence before next request
+            await asyncio.sleep_ms(self.meter_framer.gap_ms)
+
+    def meter_check(self, addr, health, answered, latency, now):
+        # any valid frame counts as answer, exception too
+        if answered:
+            if health.ok(latency):
+                log.info("Meter unit %s back", addr)
+            return
+        if health.fail(now):
+            # circuit open: unit blocks wait for probe, other units keep their rate
+            log.warning("Meter unit %s down, probe in %s ms", addr, health.backoff)
+            for block in self.poll_blocks:
+                if block.addr == addr:
+                    self.poll_sched.align(block, health.probe_at)
+
+    def poll_report(self, now):
+        # realised against target poll rate per request
+        for name, target, real, fails in self.poll_sched.rates(now):
+            log.info("Poll %s: %.2f Hz of %.2f, fails: %s", name, real, target, fails)
+        for addr, health in self.meter_health.items():
+            log.info("Meter unit %s: timeout %s ms, open: %s", addr, health.timeout, health.open)
+        self.poll_sched.reset(now)
+
+
+
+    async def espnow_receiver(self):
+        # demand from server: registers read by inverter and read rate
+        # trigger: poll now, server times it to arrive just before the inverter asks
+        # ack: selective ack of sent messages
+        async for mac, msg in self.e_lan:
+            try:
+                ack = unpack_ack(msg)
+                if ack is not None:
+                    if ack[0] == self.epoch:
+                        self.acks.ack(ack[1], ack[2], time.ticks_ms())
+                    continue
+
+                offset = unpack_trigger(msg)
+                if offset is not None:
+                    for block in self.poll_blocks:
+                        # open circuit: unit only polled by its probe
+                        if self.meter_health[block.addr].open:
+                            continue
+                        if any(request.offset == offset for request in block.members):
+                            block.triggered = True
+                            self.poll_sched.kick(block)
+                    continue
+
+                demand = unpack_demand(msg)
+                if demand is not None:
+                    log.debug("demand: %s", demand)
+                    self.demand_ticks = time.ticks_ms()
+                    self.plan_learned(demand)
+            except Exception as e:
+                log.error("demand: {}".format(e))
 
     async def send_msg(self, peer, msg):
-        import time
         before = time.ticks_us()
         if not await self.e_lan.asend(peer, msg):
-            print("send: False")
-            await asyncio.sleep(5)
+            log.warning("send: False")
         else:
-            diff = time.ticks_diff(time.ticks_us(), before)
-            print(f"send: True {diff}")
-            await asyncio.sleep(0.5)
+            log.debug("send: True %s", time.ticks_diff(time.ticks_us(), before))
+
+    async def send_batch(self, peer, records, now):
+        # link head + records, next message when payload is full
+        tx = self.tx
+        n = HEAD_LEN
+        for raw in records:
+            if n + len(raw) + CRC_LEN > ESPNOW_MAX and n > HEAD_LEN:
+                await self.send_frame(peer, n, now)
+                n = HEAD_LEN
+            tx[n:n + len(raw)] = raw
+            n += len(raw)
+        if n > HEAD_LEN:
+            await self.send_frame(peer, n, now)
+
+    async def send_frame(self, peer, n, now):
+        # seq and send time per message: server sees loss, reorder, duplicates
+        seq = self.seq
+        self.seq = (seq + 1) & 0xFFFF
+        pack_head(self.tx, self.epoch, seq, now)
+        # one integrity check for the whole message
+        n = put_crc16(self.tx, n)
+        # kept until acked
+        self.acks.add(seq, peer, self.tx_mv[:n], now)
+        self.acks_event.set()
+        try:
+            await self.send_msg(peer, self.tx_mv[:n])
+        except OSError as err:
+            if len(err.args) > 1 and err.args[1] == 'ESP_ERR_ESPNOW_NOT_FOUND':
+                self.e_lan.add_peer(peer)
+                log.info(f"peers: {self.e_lan.get_peers}")
+
+    async def espnow_retransmit(self):
+        # resend unacked messages after rto, instead of waiting for the next change or heartbeat
+        acks = self.acks
+        report = time.ticks_ms()
+        while True:
+            now = time.ticks_ms()
+            resend, wait = acks.due(now)
+            for peer, msg in resend:
+                try:
+                    await self.send_msg(peer, msg)
+                except OSError as e:
+                    log.error("resend: {}".format(e))
+
+            if time.ticks_diff(now, report) >= link_report_ms:
+                report = now
+                self.link_report()
+
+            self.acks_event.clear()
+            try:
+                await asyncio.wait_for_ms(self.acks_event.wait(), wait if wait is not None else link_report_ms)
+            except asyncio.TimeoutError:
+                pass
+
+    def link_report(self):
+        acks = self.acks
+        hist = ", ".join("<{}: {}".format(b, n) for b, n in zip(BUCKETS, acks.hist))
+        log.info("Link: acked: %s, resent: %s, dropped: %s, in flight: %s, rto: %s ms, delivery ms %s, more: %s",
+                 acks.acked, acks.resent, acks.dropped, len(acks.flight), acks.rto, hist, acks.hist[-1])
+        acks.reset()
 
     async def espnow_process(self):
-
+        # changed meter read sent as soon as parsed, fresh unchanged values every heartbeat_ms
+        # all records due at once go in one message per peer
         while True:
+            now = time.ticks_ms()
+            wait = heartbeat_ms
+            batch = {}
             for request in self.request_data:
-                if request.alive >= 5:
-                    try:
-                        await self.send_msg(request.peer, request.raw)
-                    except OSError as err:
-                        if len(err.args) > 1 and err.args[1] == 'ESP_ERR_ESPNOW_NOT_FOUND':
-                            self.e_lan.add_peer(request.peer)
-                            log.info(f"peers: {self.e_lan.get_peers}")
-
-            await asyncio.sleep(0.1)
+                if not request.fresh.ok(now):
+                    continue
+                if request.sent is not None and not request.pending:
+                    left = heartbeat_ms - time.ticks_diff(now, request.sent)
+                    if left > 0:
+                        wait = min(wait, left)
+                        continue
+
+                self.mark_sent(request, now)
+                if request.peer not in batch:
+                    batch[request.peer] = []
+                batch[request.peer].append(request.raw)
+
+            for peer, records in batch.items():
+                await self.send_batch(peer, records, now)
+
+            try:
+                await asyncio.wait_for_ms(self.send_event.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            self.send_event.clear()
 
 
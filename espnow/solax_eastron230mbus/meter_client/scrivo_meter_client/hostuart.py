@@ -0,0 +1,108 @@
+
+# In-memory UART pipe with UART-like api and rx idle irq, for RtuFramer without a board:
+# needs uasyncio and time.ticks_*, MicroPython unix port or CPython with the shims in tests/.
+# Bytes arrive after their time on the wire, rx idle irq idle_chars char times later.
+#
+#   from scrivo_meter_client import hostuart
+#   asyncio.run(hostuart.bench())
+
+import time
+
+from scrivo.tools.tool import asyncio
+
+from .rtu import RtuFramer, CHAR_BITS
+
+
+class PipeUART:
+
+    IRQ_RXIDLE = 0x1000
+
+    def __init__(self, baudrate=9600, idle_chars=2):
+        self.rx = bytearray()
+        self.peer = None
+        self.handler = None
+        self.char_us = CHAR_BITS * 1000000 // baudrate
+        self.idle_chars = idle_chars
+        # ticks_us when line to this end is free again
+        self.line = None
+
+    @classmethod
+    def pair(cls, baudrate=9600, idle_chars=2):
+        a = cls(baudrate, idle_chars)
+        b = cls(baudrate, idle_chars)
+        a.peer = b
+        b.peer = a
+        return a, b
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self.handler = handler
+
+    def any(self):
+        return len(self.rx)
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(buf), len(self.rx))
+        if nbytes is not None:
+            n = min(n, nbytes)
+        if not n:
+            return None
+        buf[:n] = self.rx[:n]
+        self.rx = self.rx[n:]
+        return n
+
+    def read(self, nbytes=-1):
+        if not self.rx:
+            return None
+        n = len(self.rx) if nbytes < 0 else min(nbytes, len(self.rx))
+        data = bytes(self.rx[:n])
+        self.rx = self.rx[n:]
+        return data
+
+    def write(self, data):
+        # transfer after earlier writes, runs as task: needs running event loop
+        peer = self.peer
+        now = time.ticks_us()
+        if peer.line is None or time.ticks_diff(peer.line, now) < 0:
+            peer.line = now
+        peer.line = time.ticks_add(peer.line, self.wire_us(len(data)))
+        asyncio.create_task(peer._receive(bytes(data), peer.line))
+        return len(data)
+
+    def wire_us(self, size):
+        return size * self.char_us
+
+    async def _receive(self, data, end):
+        await asyncio.sleep_ms((time.ticks_diff(end, time.ticks_us()) + 999) // 1000)
+        self.rx.extend(data)
+        await asyncio.sleep_ms((self.idle_chars * self.char_us + 999) // 1000)
+        # rx idle only if no later bytes on the line
+        if self.line == end and self.handler is not None:
+            self.handler(self)
+
+
+async def bench(frames=50, irq=True, expected=0):
+    # latency from last byte on the wire to frame returned by RtuFramer, us,
+    # rx idle time of PipeUART included
+    host, dev = PipeUART.pair()
+    framer = RtuFramer(dev, irq=irq)
+    frame = bytes((1, 3, 2, 0, 0, 0xB8, 0x44))
+    total = 0
+    worst = 0
+
+    for _ in range(frames):
+        async def sender():
+            await asyncio.sleep_ms(2)
+            host.write(frame)
+            return time.ticks_add(time.ticks_us(), dev.wire_us(len(frame)))
+
+        task = asyncio.create_task(sender())
+        data = await framer.read(expected, 1000)
+        done = time.ticks_us()
+        diff = time.ticks_diff(done, await task)
+        assert bytes(data) == frame
+        total += diff
+        worst = max(worst, diff)
+
+    print("RtuFramer irq={} expected={}: avg {} us, max {} us".format(
+        framer.flag is not None, expected, total // frames, worst))
+    return total // frames
@@ -0,0 +1,224 @@
+
+import time
+
+from scrivo.tools.tool import asyncio
+
+from .crc import check_crc16
+
+# RTU char on wire: start + 8 data + parity/stop + stop
+CHAR_BITS = 11
+
+# exception response: addr, func|0x80, code, crc
+EXC_LEN = 5
+
+# data bytes of a write multiple request: 123 registers or 1968 coils
+MAX_DATA = 246
+
+
+def request_len(buf, i, n):
+    # length of request frame at buf[i], 0 unknown func, -1 need more bytes
+    if n - i < 2:
+        return -1
+    func = buf[i + 1]
+    if 0x01 <= func <= 0x06:
+        return 8
+    if func in (0x0F, 0x10):
+        if n - i < 7:
+            return -1
+        # byte count must match quantity, at most 246 data bytes: noise rejected before waiting for it
+        qty = buf[i + 4] << 8 | buf[i + 5]
+        count = buf[i + 6]
+        if count != (2 * qty if func == 0x10 else (qty + 7) // 8) or not 0 < count <= MAX_DATA:
+            return 0
+        return 9 + count
+    return 0
+
+
+def response_len(func, qty):
+    # addr, func, byte_qty, data, crc
+    if func in (0x01, 0x02):
+        return 5 + (qty + 7) // 8
+    return 5 + 2 * qty
+
+
+class RtuFramer:
+
+    def __init__(self, uart, baudrate=9600, size=256, irq=True, timer=None):
+        self.uart = uart
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+
+        # end of frame: 3.5 char silence, fixed 1750us above 19200 baud
+        if baudrate > 19200:
+            self.gap_us = 1750
+        else:
+            self.gap_us = CHAR_BITS * 3500000 // baudrate
+        self.gap_ms = (self.gap_us + 999) // 1000
+
+        # rx event: UART rx idle irq wakes reader, else poll rx buffer
+        self.flag = None
+        trigger = getattr(uart, "IRQ_RXIDLE", None)
+        if irq and trigger is not None:
+            try:
+                self.flag = asyncio.ThreadSafeFlag()
+                uart.irq(self._on_rx, trigger)
+            except Exception:
+                self.flag = None
+
+        # wait timeout: one-shot hardware timer sets the same flag,
+        # without timer id or machine.Timer a wait_for_ms task per wait
+        self.timer = None
+        self.waiting = False
+        self.expired = False
+        if self.flag is not None and timer is not None:
+            try:
+                from machine import Timer
+                self.timer = Timer(timer)
+            except Exception:
+                self.timer = None
+
+    def _on_rx(self, uart):
+        self.flag.set()
+
+    def _on_timer(self, timer):
+        if self.waiting:
+            self.expired = True
+            self.flag.set()
+
+    def flush(self):
+        # drop late bytes from previous transaction
+        while self.uart.any():
+            self.uart.readinto(self.buf)
+        if self.flag is not None:
+            self.flag.clear()
+
+    async def _wait(self, ms):
+        # True on rx event, False on timeout
+        timer = self.timer
+        if timer is None:
+            try:
+                await asyncio.wait_for_ms(self.flag.wait(), ms)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        self.expired = False
+        self.waiting = True
+        timer.init(mode=timer.ONE_SHOT, period=max(ms, 1), callback=self._on_timer)
+        try:
+            await self.flag.wait()
+        finally:
+            self.waiting = False
+            timer.deinit()
+        return not self.expired
+
+    async def read(self, expected=0, timeout_ms=1000, poll_ms=1):
+        uart = self.uart
+        buf = self.buf
+        want = expected or len(buf)
+        pos = 0
+        last = 0
+        idle = False
+        start = time.ticks_ms()
+
+        while True:
+            n = uart.any()
+            if n and pos < want:
+                # read exactly up to the expected length
+                n = uart.readinto(self.mv[pos:], min(n, want - pos))
+                if n:
+                    pos += n
+                    last = time.ticks_us()
+                    if expected and pos >= 2 and buf[1] & 0x80:
+                        want = EXC_LEN
+                    if pos >= want:
+                        break
+                    # rx idle event came after these bytes: frame end
+                    if idle and not expected and not uart.any():
+                        break
+                    continue
+            elif pos and not expected:
+                # unknown length: inter-frame silence
+                if time.ticks_diff(time.ticks_us(), last) >= self.gap_us:
+                    break
+
+            left = timeout_ms - time.ticks_diff(time.ticks_ms(), start)
+            if left <= 0:
+                break
+
+            if self.flag is not None:
+                # sleep until rx idle event, in frame only for silence gap
+                idle = await self._wait(min(left, self.gap_ms) if pos and not expected else left)
+            else:
+                # idle: wait for first byte, hardware rx buffer keeps data
+                await asyncio.sleep_ms(poll_ms if not pos else 1)
+
+        if expected and pos < want:
+            # timeout inside expected frame: partial frame is no answer
+            pos = 0
+        return self.mv[:pos]
+
+
+class RtuStream:
+    # request reassembly: keeps partial frames across reads,
+    # slides over noise until a frame with valid crc, pops frames in order
+    # addrs: only partial frames to these units are kept waiting for more bytes
+
+    def __init__(self, size=256, addrs=None):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.n = 0
+        self.skipped = 0
+        self.addrs = addrs
+
+    def reset(self):
+        # line went quiet: partial frame will not complete
+        self.skipped += self.n - self.pos
+        self.pos = 0
+        self.n = 0
+
+    def feed(self, data):
+        # drop consumed bytes, then append
+        rest = self.n - self.pos
+        if rest and self.pos:
+            self.buf[0:rest] = self.mv[self.pos:self.n]
+        self.pos = 0
+        self.n = rest
+
+        size = len(data)
+        free = len(self.buf) - self.n
+        if size > free:
+            # overflow, keep newest bytes
+            self.skipped += size - free
+            data = data[size - free:]
+            size = free
+        self.buf[self.n:self.n + size] = data
+        self.n += size
+
+    def pop(self):
+        buf = self.buf
+        size = len(buf)
+        addrs = self.addrs
+        n = self.n
+        i = self.pos
+        # first partial frame candidate, kept for more bytes
+        wait = -1
+        j = i
+        while j < n:
+            length = request_len(buf, j, n)
+            if length < 0 or j + length > n:
+                if wait < 0 and length <= size and (addrs is None or buf[j] in addrs):
+                    wait = j
+            elif length and check_crc16(buf, j, j + length):
+                # complete frame, also after a partial candidate that was noise
+                self.skipped += j - i
+                self.pos = j + length
+                return self.mv[j:j + length]
+            j += 1
+
+        if wait < 0:
+            wait = n
+        self.skipped += wait - i
+        self.pos = wait
+        return None
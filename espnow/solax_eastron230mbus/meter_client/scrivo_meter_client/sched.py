@@ -0,0 +1,89 @@
+
+import time
+
+from scrivo.tools.tool import asyncio
+
+# default poll interval ms and priority of a request
+INTERVAL = 1000
+PRIORITY = 0
+
+
+class PollScheduler:
+    # deadline per block: of due blocks the highest priority goes first, then most overdue
+    # block.interval: min of member intervals, block.priority: max of member priorities
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        now = time.ticks_ms()
+        for block in blocks:
+            block.interval = min(r.interval for r in block.members)
+            block.priority = max(r.priority for r in block.members)
+            block.due = now
+            # ms of last transactions, smoothed
+            block.took = 0
+        # wakes sleeping poller on kick
+        self.event = asyncio.Event()
+        self.reset(now)
+
+    def reset(self, now=None):
+        # start of rate report window
+        self.since = time.ticks_ms() if now is None else now
+        for block in self.blocks:
+            block.polls = 0
+            block.fails = 0
+
+    def next(self, now):
+        # (block, 0) to poll now, or (None, ms to next deadline)
+        best = None
+        best_late = 0
+        wait = None
+        for block in self.blocks:
+            late = time.ticks_diff(now, block.due)
+            if late >= 0:
+                if (best is None or block.priority > best.priority
+                        or (block.priority == best.priority and late > best_late)):
+                    best = block
+                    best_late = late
+            elif wait is None or -late < wait:
+                wait = -late
+        if best is not None:
+            return best, 0
+        return None, wait if wait is not None else INTERVAL
+
+    def done(self, block, now, ok=True, took=0):
+        block.polls += 1
+        block.took = took if not block.took else (3 * block.took + took) // 4
+        if not ok:
+            block.fails += 1
+        # next deadline on the grid, no burst to catch up missed ones
+        block.due = time.ticks_add(block.due, block.interval)
+        if time.ticks_diff(now, block.due) > 0:
+            block.due = now
+
+    def align(self, block, at):
+        # next poll of block due at ticks
+        block.due = at
+
+    def kick(self, block):
+        # poll block now, wake sleeping poller
+        block.due = time.ticks_ms()
+        self.event.set()
+
+    async def sleep(self, ms):
+        # until next deadline or kick
+        self.event.clear()
+        try:
+            await asyncio.wait_for_ms(self.event.wait(), ms)
+        except asyncio.TimeoutError:
+            pass
+
+    def rates(self, now=None):
+        # realised polls per second of every request: [(name, target, real, fails)]
+        now = time.ticks_ms() if now is None else now
+        elapsed = max(time.ticks_diff(now, self.since), 1)
+        report = []
+        for block in self.blocks:
+            real = block.polls * 1000 / elapsed
+            for request in block.members:
+                report.append((request.name, 1000 / request.interval, real, block.fails))
+        return report
@@ -1,35 +1,55 @@
 
+import time
 import binascii
 import struct
 import aioespnow
 from machine import UART
 from scrivo.tools.tool import launch, asyncio
-from .crc import calc_crc16, check_crc16
+from .crc import check_crc16, put_crc16
+from .rtu import RtuFramer, RtuStream
+from .image import RegisterImage, MAX_QTY
+from .codec import compile_act
+from .fresh import Fresh, MAX_AGE
+from .demand import Demand, pack_demand, pack_trigger
+from .link import SeqTracker, unpack_head, unpack_records, pack_ack, same, WINDOW, DROP, LATE, RAW, TYPES
 
 from scrivo import logging
 log = logging.getLogger("MODBUS")
 log.setLevel(logging.DEBUG)
+# link down: summary of repeated errors, cap console lines per second
+log.suppress(10)
+log.limit(50, 100)
+
+
+class _Hex:
+    # lazy hex dump, joined only when the log line is emitted
+
+    def __init__(self, data, sep):
+        self.data = data
+        self.sep = sep
+
+    def __str__(self):
+        try:
+            return self.sep.join('{:02x}'.format(x) for x in self.data)
+        except Exception as e:
+            return "error: HEX: {}".format(e)
 
 
 def hexh(data,  sep=' '):
-    try:
-        data = f'{sep}'.join('{:02x}'.format(x) for x in data)
-    except Exception as e:
-        log.error("HEX: {}".format(e))
-    return data
+    return _Hex(data, sep)
 
 
 #TODO: move to json config
 data_register_master = {
     30013: {
-        "alive": 0,
+        "max_age": 5000,
         "raw": b'\x00',
         "value": 0,
-        "act": {"unpack": ">f", "scale": 1, "unit": "W", },
+        "act": {"type": "float32", "scale": 1, "unit": "W"},
     },
     48193: {
-        "alive": 0,
-        "raw": binascii.unhexlify("01030c436a4ccd000000000000000083ec"),
+        "max_age": 5000,
+        "raw": binascii.unhexlify("436a4ccd0000000000000000"),
         "value": 0,
         "act": None,
     },
@@ -43,26 +63,27 @@ data_register_slave = {
     40015: {
         "master": 30013,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "data_type": "int"}
+        "act": {"type": "int16", "scale": 1}
     },
 
     # solax ask from: func 03,  00 0b = 11+1 = offset 40012
     40012: {
         "master": -1,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "value": 0}
+        "act": {"type": "int16", "value": 0}
     },
 
     # solax ask from: func 03, 8+1 = offset 40009
     40009: {
         "master": -1,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "value": 0}
+        "act": {"type": "int16", "value": 0}
     },
 
     48193: {
         "master": 48193,
         "func": 0x03,
+        "qty": 6,
         "act": None
     },
 
@@ -80,6 +101,21 @@ peer = b'\x24\x68\x28\x04\x70\x0C'  # client MAC address Real Meter
 
 
 panel_slave_addr = [1]
+# send registers read by inverter and their read rate to client every demand_ms, 0: off
+demand_ms = 30000
+# trigger client poll to land this many ms before the inverter is expected to read, None: off
+prefetch_ms = 20
+# log link loss, reorder, duplicates every link_report_ms
+link_report_ms = 60000
+# no request for panel_idle_ms: panel idle, response later than panel_late_ms: late
+panel_idle_ms = 5000
+panel_late_ms = 100
+
+# modbus exception reply, None: no reply
+# register not configured: 0x02 illegal data address
+panel_exc_unknown = 0x02
+# master data older than "max_age" ms: 0x0B gateway target failed to respond, per register: "stale" in data_register_slave
+panel_exc_stale = 0x0B
 
 class Runner:
 
@@ -105,64 +141,170 @@ class Runner:
 
         self.panel_uart = UART(1, baudrate=9600, tx=13, rx=14)
         self.panel_swriter = asyncio.StreamWriter(self.panel_uart, {})
-        self.panel_sreader = asyncio.StreamReader(self.panel_uart)
         self.panel_slave_addr = panel_slave_addr
+        self.panel_framer = RtuFramer(self.panel_uart, baudrate=9600, timer=0)
+        self.panel_stream = RtuStream(addrs=self.panel_slave_addr)
+        self.panel_cache_init()
 
         launch(self.espnow_meter_server)
         launch(self.panel_receiver)
+        if demand_ms:
+            launch(self.espnow_demand)
+        if prefetch_ms is not None:
+            launch(self.espnow_prefetch)
 
 
     async def espnow_meter_server(self):
+        # sequence tracker per client
+        self.links = {}
+        report = time.ticks_ms()
+
         async for mac, msg in self.e_lan:
             # DEBUG
             log.debug(" ")
-            log.debug(f"recv: {hexh(msg)}")
+            log.debug("recv: %s", hexh(msg))
             try:
-                # msg = memoryview(msg)
-                # messege from espnow meter
-                # 01 04 00 0c - 01 04 04 c2 2c 92 3c 6a 84
-                # log.debug(f"recv: {hexh(msg)}")
-                # reg_func, reg_addr (01 04 00 0c) from request: 01 04 00 0c 00 02 b1 c8
-
-                remote_unit_addr, remote_reg_func, remote_reg_addr = struct.unpack_from('>BBH', msg, 0)
-                reg_offset = reg_code[remote_reg_func] + remote_reg_addr
-                # DEBUG
-                log.debug(f"Remote: unit_addr: {remote_unit_addr}, reg_func: {remote_reg_func}, reg_addr: {remote_reg_addr}")
-                log.debug(f"Remote: offset: {reg_offset}")
-
-                # Modbus response from meter
-                # 01 04 04 c2 2c 92 3c 6a 84 - crc: 6a 84
-                # fist 3 bytes are header request reg_func and reg_addr, data= raw modbus response from meter
-                crc, modbus_pdu = check_crc16(msg[4:])
-                # DEBUG
-                log.debug(f"CRC: {hexh(crc)}")
-
-                # 01 04 04 c2 2c 92 3c - data from crc check
-                if crc:
-                    unit_addr, reg_func, byte_qty = struct.unpack_from('BBB', modbus_pdu, 0)
-                    # DEBUG
-                    log.debug(
-                        f"unit_addr: {unit_addr}, reg_offset: {reg_offset}, byte_qty: {byte_qty}, data: {hexh(modbus_pdu)}")
-
-                    # cut unit_addr, reg_func, data_bytes_qty
-                    val_data = modbus_pdu[3:]
-                    # data 4 byte = c2 2c 92 3c
-
-                    _record = data_register_master[reg_offset]
-                    # DEBUG
-                    log.debug(f"act: {_record}")
-
-                    if _record["act"] is not None:
-                        _record["value"] = self._act(val_data, **_record["act"])
-
-                    _record["alive"] = 10
-                    _record["raw"] = modbus_pdu
-
+                head = unpack_head(msg)
+                if head is None:
+                    log.warning("meter_server: unknown message")
+                    continue
+                # one crc over head and records
+                if not check_crc16(msg):
+                    log.warning("meter_server: crc error")
+                    continue
+
+                mac = bytes(mac)
+                link = self.links.get(mac)
+                if link is None:
+                    link = self.links[mac] = SeqTracker()
+                # duplicate: already processed
+                state = link.update(head[0], head[1], head[2])
+                if state != DROP:
+                    mv = memoryview(msg)
+                    for func, reg, code, start, end in unpack_records(mv):
+                        if func not in reg_code:
+                            log.warning("meter_server: record func: %s", func)
+                            continue
+                        self.meter_record(mv, reg_code[func] + reg, code, start, end, head[1], state == LATE)
+
+                # selective ack, duplicates too: first ack may be lost
+                try:
+                    await self.e_lan.asend(mac, pack_ack(link.epoch, link.top, link.seen), False)
+                except OSError as e:
+                    log.error("ack: {}".format(e))
+
+                if time.ticks_diff(time.ticks_ms(), report) >= link_report_ms:
+                    report = time.ticks_ms()
+                    self.link_report()
             except Exception as e:
                 log.error("meter_server: {}".format(e))
 
+    def link_report(self):
+        for mac, link in self.links.items():
+            log.info("Link %s: received: %s, lost: %s, loss: %.1f%%, reordered: %s, duplicates: %s, expired: %s, restarts: %s, jitter: %s ms",
+                     hexh(mac, ':'), link.received, link.lost, 100 * link.loss(), link.reordered,
+                     link.duplicates, link.expired, link.restarts, link.jitter)
+            link.reset()
+
+    def meter_record(self, msg, reg_offset, code, start, end, seq, late=False):
+        # register data of master record reg_offset at msg[start:end], written into the record
+        _record = data_register_master.get(reg_offset)
+        if _record is None:
+            log.debug("unknown offset: %s", reg_offset)
+            return
+
+        # value type on air must be the one this record decodes, raw data at least its size
+        codec = _record["codec"]
+        if code != RAW:
+            if codec is None or TYPES.get(codec.type) != code:
+                log.warning("meter_server: record %s type %s, expected %s", reg_offset, code, codec and codec.type)
+                return
+        elif codec is not None and end - start < codec.size:
+            log.warning("meter_server: record %s size %s, expected %s", reg_offset, end - start, codec.size)
+            return
+        # DEBUG
+        log.debug("reg_offset: %s, data: %s", reg_offset, hexh(msg[start:end]))
+
+        # late message, record has newer data
+        if late and _record["seq"] is not None and (_record["seq"] - seq) & 0xFFFF < WINDOW:
+            return
+        _record["seq"] = seq
+
+        _record["fresh"].touch()
+        if _record["trigger"] is not None:
+            # trigger to data round trip
+            took = time.ticks_diff(time.ticks_ms(), _record["trigger"])
+            _record["lead"] = (3 * _record["lead"] + took) // 4
+            # lost triggered read closed by a later heartbeat: lead not beyond one read interval
+            interval = _record["demand"].interval
+            if interval:
+                _record["lead"] = min(_record["lead"], interval)
+            _record["trigger"] = None
+
+        val_data = msg[start:end]
+        raw = _record["raw"]
+        if isinstance(raw, bytearray) and len(raw) == len(val_data):
+            # keep-alive, same data: nothing to decode
+            if same(raw, val_data):
+                return
+            raw[:] = val_data
+        else:
+            _record["raw"] = bytearray(val_data)
+
+        if _record["codec"] is not None:
+            _record["value"] = _record["codec"].decode(val_data)
+
+        # rebuild inverter responses fed by this record
+        self.panel_cache_update(reg_offset)
+
+    async def espnow_demand(self):
+        # client polls only what the inverter reads, at its read rate
+        while True:
+            await asyncio.sleep_ms(demand_ms)
+            now = time.ticks_ms()
+            records = {}
+            for offset, data_master in data_register_master.items():
+                demand = data_master["demand"]
+                if demand.active(now, demand_ms):
+                    records[offset] = demand.interval or 0
+            try:
+                await self.e_lan.asend(peer, pack_demand(records))
+                log.debug("demand: %s", records)
+            except Exception as e:
+                log.error("demand: {}".format(e))
 
-
+    async def espnow_prefetch(self):
+        # learned period and phase of inverter reads: trigger client poll one round trip ahead
+        while True:
+            now = time.ticks_ms()
+            wait = 1000
+            for offset, data_master in data_register_master.items():
+                demand = data_master["demand"]
+                if not demand.interval or not demand.active(now, 2 * demand.interval):
+                    continue
+                lead = data_master["lead"] + prefetch_ms
+                target = demand.next(now)
+                # one trigger per expected read: only for a read after the last one triggered
+                last = data_master["target"]
+                if last is not None and time.ticks_diff(target, last) <= 0:
+                    target = time.ticks_add(last, demand.interval)
+                left = time.ticks_diff(target, now) - lead
+                # lead longer than interval: trigger at most once per interval
+                if data_master["sent"] is not None:
+                    left = max(left, demand.interval - time.ticks_diff(now, data_master["sent"]))
+                if left > 0:
+                    wait = min(wait, left)
+                    continue
+
+                data_master["target"] = target
+                data_master["trigger"] = now
+                data_master["sent"] = now
+                try:
+                    await self.e_lan.asend(peer, pack_trigger(offset), False)
+                except Exception as e:
+                    log.error("prefetch: {}".format(e))
+                wait = 0
+            await asyncio.sleep_ms(wait)
 
     # log.debug("panel_emu")
     # # dayie: 01 03 20 00 00 06 ce 08
@@ -177,30 +319,58 @@ class Runner:
     #     return data
 
     async def panel_receiver(self):
+        # port is read all the time: no sleep on idle, requests never wait unread
+        stats = self.panel_stats = {"requests": 0, "answered": 0, "exceptions": 0, "missed": 0, "late": 0}
+        stream = self.panel_stream
+        last = time.ticks_ms()
+        idle = False
 
         while True:
             try:
-                data = b''
-                try:  # wait for response and read it
-                    data = await asyncio.wait_for(self.panel_sreader.read_uart(-1), 1)
-                except asyncio.TimeoutError:
-                    log.debug('Panel got timeout')
-                    await asyncio.sleep(5)
-                    # emu for dev
-                    # data = self.panel_emu()
-
-                if data != b'':
-                    pdu_response = self.panel_request_decode(data)
-                    if pdu_response is not None:
-                        await self.panel_swriter.awrite(pdu_response)
+                data = await self.panel_framer.read(0, 1000, 5 if idle else 1)
+
+                if not len(data):
+                    stream.reset()
+                    # idle detection, only slower polling of rx buffer
+                    if not idle and time.ticks_diff(time.ticks_ms(), last) > panel_idle_ms:
+                        idle = True
+                        log.info("Panel idle, stats: %s, skipped bytes: %s", stats, stream.skipped)
+                    continue
+
+                received = time.ticks_ms()
+                last = received
+                idle = False
+
+                # split, joined or noisy reads: every complete request in order
+                stream.feed(data)
+                while True:
+                    request = stream.pop()
+                    if request is None:
+                        break
+                    if request[0] not in self.panel_slave_addr:
+                        continue
+
+                    # no log drain until response is sent
+                    logging.hold(50)
+                    stats["requests"] += 1
+                    pdu_response = self.panel_request_decode(request)
+                    if pdu_response is None:
+                        stats["missed"] += 1
+                        continue
+
+                    await self.panel_swriter.awrite(pdu_response)
+                    stats["answered"] += 1
+                    if pdu_response[1] & 0x80:
+                        stats["exceptions"] += 1
+                    if time.ticks_diff(time.ticks_ms(), received) > panel_late_ms:
+                        stats["late"] += 1
             except Exception as e:
                 log.error("PANEL: {}".format(e))
 
     def panel_request_decode(self, request):
-        value_byte = None
         # DEBUG
         log.debug(" ")
-        log.debug(f" << uart request: {hexh(request)} - {len(request)}")
+        log.debug(" << uart request: %s - %s", hexh(request), len(request))
 
         if len(request) < 8:
             return None
@@ -208,99 +378,175 @@ class Runner:
         if request[0] not in self.panel_slave_addr:
             return None
 
-        crc, request_data = check_crc16(request)
+        # function first: write requests are longer than 8 bytes, frame crc checked by RtuStream
+        if request[1] not in reg_code:
+            # 0x01 illegal function
+            return self.make_exc_response(request[0], request[1], 0x01)
+
+        crc = check_crc16(request, 0, 8)
         # DEBUG
-        log.debug(f"       crc check: {hexh(crc)}")
+        log.debug("       crc check: %s", crc)
 
         if crc:
             # Request param
-            unit_addr, reg_func, reg_addr, qty = struct.unpack_from('>BBHH', request_data, 0)  # 00: 00 : 00 00 : 00 00
+            unit_addr, reg_func, reg_addr, qty = struct.unpack_from('>BBHH', request, 0)  # 00: 00 : 00 00 : 00 00
             # DEBUG
-            log.debug(f"   addr: {unit_addr}, func: {reg_func}, reg_addr: {reg_addr}, qty: {qty} ")
+            log.debug("   addr: %s, func: %s, reg_addr: %s, qty: %s ", unit_addr, reg_func, reg_addr, qty)
 
             # Calc offset
             reguest_offset = reg_code[reg_func]+reg_addr
             # DEBUG
-            log.debug(f"   offset: {reguest_offset}")
-
-            # Check if reguest exist, that map for request.
-            if reguest_offset in data_register_slave:
-                data_slave = data_register_slave[reguest_offset]
-                master_offset = data_slave["master"]
-
-                # if data exist in data_register_master
-                if master_offset in data_register_master:
-                    data_master = data_register_master[master_offset]
-
-                    # DEBUG
-                    log.debug(f"   - alive: {data_master['alive']}")
-
-                    # get value if data alive
-                    if data_master["alive"] >= 5:
-                        data_master["alive"] -= 1
-                        # get value from master record and conver for rigt response
-                        if data_slave["act"] is not None:
-                            value_byte = self._act(data_master["value"], **data_slave["act"])
-                        # get value from master record, that is raw data from device
-                        else:
-                            value_byte = data_master["raw"]
-                            # DEBUG
-                            log.debug(f"   Modbus raw: {hexh(value_byte)}")
-                            return value_byte
-
-                # if -1, get value from action == emulate response
-                elif master_offset == -1:
-                    value_byte = self._act(**data_slave["act"])
-
-            return self.make_pdu_response(unit_addr, reg_func, value_byte)
-
-    def _act(self, value=None, **act):
-        # DEBUG
-        log.debug(f"   act : {act}")
+            log.debug("   offset: %s", reguest_offset)
 
-        if value is None:
-            value = act["value"]
-        # DEBUG
-        log.debug(f"   value: {value}")
-
-        # pack value to bytes
-        if "pack" in act:
-            # convert value
-            if "data_type" in act:
-                data_type = act["data_type"]
-                if data_type == "int":
-                    value = int(value)
-                if data_type == "float":
-                    value = float(value)
-                value * act["scale"]
-                # DEBUG
-                log.debug(f"   value convert: {value}")
+            # prebuilt response for request offset and unit, if qty match
+            entry = self.panel_pdu.get(reguest_offset << 8 | unit_addr)
+            if entry is not None and len(entry[0]) == 5 + 2 * qty:
+                pdu, data_master, exc_pdu = entry
 
-            value_byte = struct.pack(act["pack"], value)
-            # pack to len_byte+value_byte
-            value = struct.pack("B", len(value_byte)) + value_byte
-            # DEBUG
-            log.debug(f"   act bytes: {hexh(value)}")
+                # emulated response, always valid
+                if data_master is None:
+                    return pdu
 
-        if "unpack" in act:
-            value = struct.unpack(act["unpack"], value)[0]
-            # DEBUG
-            log.debug(f"   act value: {value}")
+                # learn what the inverter reads and how often
+                data_master["demand"].hit()
 
-        return value
+                # DEBUG
+                log.debug("   - age: %s", data_master["fresh"].age())
+
+                # get response if data not older than max_age
+                if data_master["fresh"].ok():
+                    return pdu
+                # fast negative reply by register policy
+                return exc_pdu
+
+            # any other FC03/FC04 range, served from register image
+            data = self.panel_image.read(reg_func, reg_addr, qty)
+            if data is None:
+                return self.make_exc_response(unit_addr, reg_func, panel_exc_unknown)
+            for data_master in self.panel_image.records(reg_func, reg_addr, qty):
+                data_master["demand"].hit()
+            # register policy of first stale record
+            span = self.panel_image.stale(reg_func, reg_addr, qty)
+            if span is not None:
+                return self.make_exc_response(unit_addr, reg_func, span[3])
+            return self.make_image_response(unit_addr, reg_func, data)
+
+    def panel_cache_init(self):
+        # response cache key: offset << 8 | unit_addr, value: (pdu, data_master, exception pdu)
+        self.panel_pdu = {}
+        # exception cache key: code << 16 | func << 8 | unit_addr
+        self.panel_exc = {}
+        # register image per func, answer any range of configured registers
+        self.panel_image = RegisterImage()
+        self.panel_tx = bytearray(2 * MAX_QTY + 5)
+        # value converters compiled once from act, time based freshness
+        for data_master in data_register_master.values():
+            data_master["codec"] = compile_act(data_master["act"])
+            data_master["fresh"] = Fresh(data_master.get("max_age", MAX_AGE))
+            data_master["demand"] = Demand()
+            # prefetch: ticks of pending trigger, next expected read, trigger to data ms, last trigger sent
+            data_master["trigger"] = None
+            data_master["target"] = None
+            data_master["sent"] = None
+            data_master["lead"] = 100
+            # link seq of last applied message
+            data_master["seq"] = None
+
+        # master offset -> slave offsets fed by it
+        self.slave_map = {}
+        for offset, data_slave in data_register_slave.items():
+            data_slave["codec"] = compile_act(data_slave["act"])
+            master_offset = data_slave["master"]
+            if master_offset not in self.slave_map:
+                self.slave_map[master_offset] = []
+            self.slave_map[master_offset].append(offset)
+
+            func = data_slave["func"]
+            if func in (0x03, 0x04):
+                if "qty" in data_slave:
+                    qty = data_slave["qty"]
+                else:
+                    qty = data_slave["codec"].size // 2
+                self.panel_image.add(func, offset - reg_code[func], qty, data_register_master.get(master_offset),
+                                     data_slave.get("stale", panel_exc_stale))
+        self.panel_image.build()
+
+        # emulated responses (master: -1) are static, build once
+        self.panel_cache_update(-1)
+
+    def panel_cache_update(self, master_offset):
+        data_master = data_register_master.get(master_offset)
+
+        for offset in self.slave_map.get(master_offset, ()):
+            data_slave = data_register_slave[offset]
+            codec = data_slave["codec"]
+
+            # if -1, get value from codec == emulate response
+            if data_master is None:
+                value_byte = codec.encode()
+            # get value from master record and conver for rigt response
+            elif codec is not None:
+                value_byte = codec.encode(data_master["value"])
+            # raw register data from device
+            else:
+                value_byte = data_master["raw"]
+
+            for unit_addr in self.panel_slave_addr:
+                # byte_qty+data
+                pdu = self.make_pdu_response(unit_addr, data_slave["func"], struct.pack("B", len(value_byte)) + value_byte)
+                exc_pdu = self.make_exc_response(unit_addr, data_slave["func"], data_slave.get("stale", panel_exc_stale))
+                self.panel_pdu[offset << 8 | unit_addr] = (bytes(pdu), data_master, exc_pdu)
+
+            self.panel_image.write(data_slave["func"], offset - reg_code[data_slave["func"]], value_byte)
 
     def make_pdu_response(self, unit_addr, reg_func, value_byte):
         if value_byte is not None:
             # DEBUG
-            log.debug(f"  Modbus data:      {hexh(value_byte)}")
+            log.debug("  Modbus data:      %s", hexh(value_byte))
 
-            modbus_pdu = bytearray()
-            modbus_pdu.append(unit_addr)                    # unit_addr
-            modbus_pdu.extend(struct.pack('B', reg_func))   # reg_func
-            modbus_pdu.extend(value_byte)                   # value_byte
-            modbus_pdu.extend(calc_crc16(modbus_pdu))       # crc
+            end = len(value_byte) + 2
+            modbus_pdu = bytearray(end + 2)
+            modbus_pdu[0] = unit_addr                       # unit_addr
+            modbus_pdu[1] = reg_func                        # reg_func
+            modbus_pdu[2:end] = value_byte                  # value_byte
+            put_crc16(modbus_pdu, end)                      # crc
 
             # DEBUG
-            log.debug(f"  Modbus Pdu: {hexh(modbus_pdu)}")
+            log.debug("  Modbus Pdu: %s", hexh(modbus_pdu))
 
             return modbus_pdu
+
+    def make_image_response(self, unit_addr, reg_func, data):
+        # one copy from image to preallocated tx buffer
+        end = len(data) + 3
+        modbus_pdu = self.panel_tx
+        modbus_pdu[0] = unit_addr
+        modbus_pdu[1] = reg_func
+        modbus_pdu[2] = len(data)
+        modbus_pdu[3:end] = data
+        put_crc16(modbus_pdu, end)
+
+        # DEBUG
+        log.debug("  Modbus Pdu: %s", hexh(modbus_pdu[:end + 2]))
+
+        return memoryview(modbus_pdu)[:end + 2]
+
+    def make_exc_response(self, unit_addr, reg_func, code):
+        # exception pdu: addr, func | 0x80, code, crc; code None: no reply
+        if code is None:
+            return None
+
+        key = code << 16 | reg_func << 8 | unit_addr
+        modbus_pdu = self.panel_exc.get(key)
+        if modbus_pdu is None:
+            buf = bytearray(5)
+            buf[0] = unit_addr
+            buf[1] = reg_func | 0x80
+            buf[2] = code
+            put_crc16(buf, 3)
+            modbus_pdu = self.panel_exc[key] = bytes(buf)
+
+        # DEBUG
+        log.debug("  Modbus exception: %s", hexh(modbus_pdu))
+
+        return modbus_pdu
@@ -0,0 +1,79 @@
+
+import struct
+import time
+
+# reads closer than BURST_MS: same consumer cycle
+BURST_MS = 50
+
+# espnow demand message: DEMAND + (offset u32, interval u16 ms, 0 rate unknown) per record
+DEMAND = 0xD5
+_REC = ">IH"
+_REC_LEN = 6
+
+# espnow prefetch trigger: TRIGGER + offset u32, poll now
+TRIGGER = 0xD6
+
+
+class Demand:
+    # read rate of a value, learned from inverter requests
+
+    def __init__(self):
+        self.ticks = None
+        self.interval = None
+        self.count = 0
+
+    def hit(self, now=None):
+        now = time.ticks_ms() if now is None else now
+        self.count += 1
+        if self.ticks is not None:
+            dt = time.ticks_diff(now, self.ticks)
+            if dt < BURST_MS:
+                return
+            # smoothed time between reads
+            self.interval = dt if self.interval is None else (3 * self.interval + dt) // 4
+        self.ticks = now
+
+    def active(self, now, window_ms):
+        # read at least once in the last window
+        return self.ticks is not None and time.ticks_diff(now, self.ticks) <= window_ms
+
+    def next(self, now, lead=0):
+        # ticks of next expected read at least lead ms ahead, None if rate unknown
+        if self.interval is None:
+            return None
+        late = time.ticks_diff(now, self.ticks) + lead
+        k = late // self.interval + 1 if late >= 0 else 0
+        return time.ticks_add(self.ticks, k * self.interval)
+
+
+def pack_demand(records):
+    # records: {offset: interval ms}
+    msg = bytearray(1 + _REC_LEN * len(records))
+    msg[0] = DEMAND
+    i = 1
+    for offset, interval in records.items():
+        struct.pack_into(_REC, msg, i, offset, min(interval, 0xFFFF))
+        i += _REC_LEN
+    return msg
+
+
+def unpack_demand(msg):
+    # None if not a demand message
+    if not len(msg) or msg[0] != DEMAND:
+        return None
+    records = {}
+    for i in range(1, len(msg) - _REC_LEN + 1, _REC_LEN):
+        offset, interval = struct.unpack_from(_REC, msg, i)
+        records[offset] = interval
+    return records
+
+
+def pack_trigger(offset):
+    return struct.pack(">BI", TRIGGER, offset)
+
+
+def unpack_trigger(msg):
+    # offset, None if not a trigger message
+    if len(msg) != 5 or msg[0] != TRIGGER:
+        return None
+    return struct.unpack_from(">I", msg, 1)[0]
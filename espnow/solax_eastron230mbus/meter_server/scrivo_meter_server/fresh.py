@@ -0,0 +1,26 @@
+
+import time
+
+# default max age of a value, ms
+MAX_AGE = 5000
+
+
+class Fresh:
+    # time based freshness of a value: touch() on update, ok() while age <= max_age ms
+
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self.ticks = None
+
+    def touch(self, now=None):
+        self.ticks = time.ticks_ms() if now is None else now
+
+    def age(self, now=None):
+        # ms since last update, None if never updated
+        if self.ticks is None:
+            return None
+        return time.ticks_diff(time.ticks_ms() if now is None else now, self.ticks)
+
+    def ok(self, now=None):
+        age = self.age(now)
+        return age is not None and 0 <= age <= self.max_age
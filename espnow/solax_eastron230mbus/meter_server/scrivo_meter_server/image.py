@@ -0,0 +1,81 @@
+
+# FC03/FC04 limit of registers in one read
+MAX_QTY = 125
+
+
+class RegisterImage:
+
+    def __init__(self, max_gap=16):
+        # join slave ranges closer than max_gap registers into one segment
+        self.max_gap = max_gap
+        # func -> [[start_reg, end_reg, bytearray, memoryview], ...]
+        self.segments = {}
+        # func -> [(start_reg, end_reg, data_master, stale exception code), ...]
+        self.spans = {}
+
+    def add(self, func, reg_addr, qty, data_master=None, stale=None):
+        if func not in self.spans:
+            self.spans[func] = []
+        self.spans[func].append((reg_addr, reg_addr + qty, data_master, stale))
+
+    def build(self):
+        for func, spans in self.spans.items():
+            spans.sort(key=lambda s: s[0])
+            segments = []
+            for start, end, _, _ in spans:
+                if segments and start <= segments[-1][1] + self.max_gap:
+                    segments[-1][1] = max(segments[-1][1], end)
+                else:
+                    segments.append([start, end])
+
+            for segment in segments:
+                buf = bytearray(2 * (segment[1] - segment[0]))
+                segment.append(buf)
+                segment.append(memoryview(buf))
+            self.segments[func] = segments
+
+    def _find(self, func, reg_addr, qty):
+        for segment in self.segments.get(func, ()):
+            if segment[0] <= reg_addr and reg_addr + qty <= segment[1]:
+                return segment
+
+    def write(self, func, reg_addr, data):
+        segment = self._find(func, reg_addr, len(data) // 2)
+        if segment is not None:
+            idx = 2 * (reg_addr - segment[0])
+            segment[2][idx:idx + len(data)] = data
+
+    def read(self, func, reg_addr, qty):
+        # zero copy view of registers, None if range unknown
+        if qty < 1 or qty > MAX_QTY:
+            return None
+
+        segment = self._find(func, reg_addr, qty)
+        if segment is None:
+            return None
+
+        end = reg_addr + qty
+        for start, stop, _, _ in self.spans[func]:
+            if start < end and reg_addr < stop:
+                idx = 2 * (reg_addr - segment[0])
+                return segment[3][idx:idx + 2 * qty]
+        return None
+
+    def _spans(self, func, reg_addr, qty):
+        # spans of configured registers in range with master record
+        end = reg_addr + qty
+        for span in self.spans.get(func, ()):
+            if span[0] < end and reg_addr < span[1] and span[2] is not None:
+                yield span
+
+    def records(self, func, reg_addr, qty):
+        # master records of configured registers in range
+        for span in self._spans(func, reg_addr, qty):
+            yield span[2]
+
+    def stale(self, func, reg_addr, qty):
+        # first span in range with data not fresh, None: all fresh
+        for span in self._spans(func, reg_addr, qty):
+            if not span[2]["fresh"].ok():
+                return span
+        return None
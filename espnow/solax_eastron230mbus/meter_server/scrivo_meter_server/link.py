@@ -0,0 +1,272 @@
+
+import struct
+import time
+
+# espnow data message: version u8, epoch u16, seq u16, ts_ms u32, records, crc16 of all before
+# epoch: random per sender boot, sequence numbers of a new boot are not old ones again
+VERSION = 3
+HEAD = ">BHHI"
+HEAD_LEN = 9
+CRC_LEN = 2
+
+# record: func u8, start reg u16, type u8, [length u8 if RAW], value as meter registers, big endian
+# func and reg as read from the meter: any register of FC01-04 addressable
+# type code -> value size, RAW: any register data
+RAW = 0
+TYPES = {"int16": 1, "uint16": 2, "int32": 3, "uint32": 4, "float32": 5}
+SIZES = (None, 2, 2, 4, 4, 4)
+
+# espnow payload limit, largest record that fits one message
+ESPNOW_MAX = 250
+RECORD_MAX = ESPNOW_MAX - HEAD_LEN - CRC_LEN
+
+# sequence numbers further back than WINDOW: too late, dropped
+WINDOW = 32
+
+# selective ack from receiver: ACK, epoch u16, top seq u16, bitmap u32 (bit i: seq top - i received)
+ACK = 0xA5
+ACK_LEN = 9
+
+# delivery latency histogram upper bounds, ms, last bucket: above
+BUCKETS = (5, 10, 20, 50, 100, 200, 500)
+
+# SeqTracker.update: drop, newest so far, late message filling a gap
+DROP = 0
+NEW = 1
+LATE = 2
+
+
+def pack_head(buf, epoch, seq, ts):
+    struct.pack_into(HEAD, buf, 0, VERSION, epoch, seq & 0xFFFF, ts & 0xFFFFFFFF)
+
+
+def unpack_head(msg):
+    # (epoch, seq, ts), None if not a data message of this version
+    if len(msg) < HEAD_LEN or msg[0] != VERSION:
+        return None
+    return struct.unpack_from(">HHI", msg, 1)
+
+
+def record_len(size, type_name=None):
+    # record length for size bytes of register data
+    code = TYPES.get(type_name, RAW)
+    return (4 if code != RAW and SIZES[code] == size else 5) + size
+
+
+def pack_record(func, reg, data, type_name=None):
+    # record with value, typed if register data size matches the type
+    code = TYPES.get(type_name, RAW)
+    if code != RAW and SIZES[code] != len(data):
+        code = RAW
+    i = 4 if code != RAW else 5
+    buf = bytearray(i + len(data))
+    struct.pack_into(">BHB", buf, 0, func, reg, code)
+    if code == RAW:
+        buf[4] = len(data)
+    buf[i:] = data
+    return buf, i
+
+
+def unpack_records(msg, i=HEAD_LEN, end=None):
+    # (func, reg, type, value start, value end) of every record, one pass, no copy
+    if end is None:
+        end = len(msg) - CRC_LEN
+    while i + 4 <= end:
+        func = msg[i]
+        reg = msg[i + 1] << 8 | msg[i + 2]
+        code = msg[i + 3]
+        i += 4
+        if code == RAW:
+            if i >= end:
+                return
+            size = msg[i]
+            i += 1
+        elif code < len(SIZES):
+            size = SIZES[code]
+        else:
+            return
+        if i + size > end:
+            return
+        yield func, reg, code, i, i + size
+        i += size
+
+
+def pack_ack(epoch, top, seen):
+    return struct.pack(">BHHI", ACK, epoch, top, seen)
+
+
+def unpack_ack(msg):
+    # (epoch, top, seen), None if not an ack
+    if len(msg) != ACK_LEN or msg[0] != ACK:
+        return None
+    return struct.unpack_from(">HHI", msg, 1)
+
+
+def same(a, b):
+    # equal buffers of any kind, no allocation
+    if len(a) != len(b):
+        return False
+    for k in range(len(a)):
+        if a[k] != b[k]:
+            return False
+    return True
+
+
+class SeqTracker:
+    # receiver side: loss, reordering and duplicates of one sender from u16 sequence numbers
+    # bit i of seen: seq top - i received, new epoch: sender restarted
+
+    def __init__(self):
+        self.epoch = None
+        self.top = None
+        self.seen = 0
+        self.reset()
+
+    def reset(self):
+        # counters of report window
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.expired = 0
+        self.restarts = 0
+        self.jitter = 0
+        self.delay = None
+
+    def update(self, epoch, seq, ts, now=None):
+        # DROP duplicate or too late, NEW or LATE to be processed
+        if epoch != self.epoch:
+            if self.epoch is not None:
+                self.restarts += 1
+            self.epoch = epoch
+            self._restart(seq)
+            self.received += 1
+            return NEW
+
+        ahead = (seq - self.top) & 0xFFFF
+        if ahead == 0:
+            self.duplicates += 1
+            return DROP
+
+        state = NEW
+
+        if ahead < 0x8000:
+            # gap counted lost until a late message fills it, gap beyond the bitmap for good
+            self.lost += ahead - 1
+            self.seen = (self.seen << ahead | 1) & 0xFFFFFFFF if ahead < WINDOW else 1
+            self.top = seq
+        else:
+            back = (self.top - seq) & 0xFFFF
+            if back >= WINDOW:
+                self.expired += 1
+                return DROP
+            elif self.seen >> back & 1:
+                self.duplicates += 1
+                return DROP
+            else:
+                self.seen |= 1 << back
+                self.reordered += 1
+                self.lost -= 1
+                state = LATE
+        self.received += 1
+        self._transit(ts, now)
+        return state
+
+    def _restart(self, seq):
+        # sender clock restarted too
+        self.top = seq
+        self.seen = 1
+        self.delay = None
+
+    def _transit(self, ts, now):
+        # one way delay variation: sender and receiver clocks differ by a constant
+        delay = time.ticks_diff(time.ticks_ms() if now is None else now, ts)
+        if self.delay is None or delay < self.delay:
+            self.delay = delay
+        self.jitter = max(self.jitter, delay - self.delay)
+
+    def loss(self):
+        # loss rate of report window, 0..1
+        total = self.received + self.lost
+        return self.lost / total if total else 0
+
+
+class AckWindow:
+    # sender side: messages in flight until acked, resent after adaptive rto with back-off
+    # full window: oldest message given up, newer data matters more
+
+    def __init__(self, size=8, retries=3, rto_min=20, rto_max=1000):
+        self.size = size
+        self.retries = retries
+        self.rto_min = rto_min
+        self.rto_max = rto_max
+        # seq -> [peer, message, first send ticks, last send ticks, sends]
+        self.flight = {}
+
+        self.srtt = None
+        self.rttvar = 0
+        self.rto = 200
+        self.reset()
+
+    def reset(self):
+        # counters of report window
+        self.hist = [0] * (len(BUCKETS) + 1)
+        self.acked = 0
+        self.resent = 0
+        self.dropped = 0
+
+    def add(self, seq, peer, msg, now):
+        if len(self.flight) >= self.size:
+            oldest = max(self.flight, key=lambda s: (seq - s) & 0xFFFF)
+            del self.flight[oldest]
+            self.dropped += 1
+        self.flight[seq] = [peer, bytes(msg), now, now, 1]
+
+    def ack(self, top, seen, now):
+        for i in range(32):
+            if not seen >> i & 1:
+                continue
+            entry = self.flight.pop((top - i) & 0xFFFF, None)
+            if entry is None:
+                continue
+            self.acked += 1
+            self._hist(time.ticks_diff(now, entry[2]))
+            # rtt only from messages sent once
+            if entry[4] == 1:
+                self._rtt(time.ticks_diff(now, entry[3]))
+
+    def _hist(self, ms):
+        k = 0
+        while k < len(BUCKETS) and ms >= BUCKETS[k]:
+            k += 1
+        self.hist[k] += 1
+
+    def _rtt(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt // 2
+        else:
+            self.rttvar = (3 * self.rttvar + abs(self.srtt - rtt)) // 4
+            self.srtt = (7 * self.srtt + rtt) // 8
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.rto_min), self.rto_max)
+
+    def due(self, now):
+        # ([(peer, message), ...] to resend now, ms to next timeout or None)
+        resend = []
+        wait = None
+        for seq in list(self.flight):
+            entry = self.flight[seq]
+            timeout = min(self.rto << (entry[4] - 1), self.rto_max)
+            left = timeout - time.ticks_diff(now, entry[3])
+            if left <= 0:
+                if entry[4] > self.retries:
+                    del self.flight[seq]
+                    self.dropped += 1
+                    continue
+                entry[3] = now
+                entry[4] += 1
+                self.resent += 1
+                resend.append((entry[0], entry[1]))
+                left = min(self.rto << (entry[4] - 1), self.rto_max)
+            wait = left if wait is None else min(wait, left)
+        return resend, wait
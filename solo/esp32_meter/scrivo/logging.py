@@ -1,4 +1,6 @@
+import io
 import sys
+import time
 
 CRITICAL = 50
 ERROR    = 40
@@ -18,9 +20,16 @@ _level_dict = {
 # _stream = sys.stderr
 _stream = sys.stdout
 
+# max messages tracked for repeat suppression per logger
+_REPEAT_KEYS = 8
+
 class Logger:
 
     level = NOTSET
+    # repeat suppression: msg -> [first ticks, count, level]
+    _repeats = None
+    # token bucket: lines per second, 0 = off
+    _rate = 0
 
     def __init__(self, name):
         self.name = name
@@ -37,22 +46,87 @@ class Logger:
     def isEnabledFor(self, level):
         return level >= (self.level or _level)
 
+    def suppress(self, window_s=10, level=WARNING):
+        # same message (level and above) again within window is counted, then one summary line
+        self.repeat_ms = int(window_s * 1000)
+        self.repeat_level = level
+        self._repeats = {}
+
+    def limit(self, rate, burst=None, level=WARNING):
+        # token bucket for lines below level: rate lines per second, up to burst at once
+        # warnings and errors always pass, debug traffic can not starve them
+        self._rate = rate
+        self.limit_level = level
+        self._burst = burst or rate
+        self._tokens = self._burst
+        self._refill = time.ticks_ms()
+        self.limited = 0
+
+    def _flush_repeats(self, now):
+        # summary for messages with expired window
+        repeats = self._repeats
+        for key, rec in list(repeats.items()):
+            if time.ticks_diff(now, rec[0]) >= self.repeat_ms:
+                del repeats[key]
+                if rec[1]:
+                    self._emit(rec[2], "{} repeats in {:.1f} s: {}".format(
+                        rec[1], time.ticks_diff(now, rec[0]) / 1000, key))
+
+    def _repeat(self, level, msg, now):
+        repeats = self._repeats
+        rec = repeats.get(msg)
+        if rec is not None:
+            rec[1] += 1
+            return True
+        if len(repeats) < _REPEAT_KEYS:
+            repeats[msg] = [now, 0, level]
+        return False
+
+    def _take(self):
+        now = time.ticks_ms()
+        self._tokens = min(self._burst, self._tokens + time.ticks_diff(now, self._refill) * self._rate / 1000)
+        self._refill = now
+        if self._tokens < 1:
+            self.limited += 1
+            return False
+
+        self._tokens -= 1
+        if self.limited:
+            limited, self.limited = self.limited, 0
+            self._emit(WARNING, "{} lines rate limited".format(limited))
+        return True
+
+    def _emit(self, level, msg):
+        # one write per line, buffered sink if set
+        line = "{}:{}:{}\n".format(self._level_str(level), self.name, msg)
+        if _sink is not None:
+            _sink.emit(level, self.name, line)
+        else:
+            _stream.write(line)
+
     def log(self, level, msg, *args):
         if level >= (self.level or _level):
-            # _stream.write("%s:%s:" % (self._level_str(level), self.name))
-            _stream.write("{}:{}:".format(self._level_str(level), self.name))
-            if not args:
-                print(msg, file=_stream)
-            else:
-                print(msg % args, file=_stream)
+            if args:
+                msg = msg % args
+            if self._repeats is not None:
+                now = time.ticks_ms()
+                if self._repeats:
+                    self._flush_repeats(now)
+                if level >= self.repeat_level and self._repeat(level, msg, now):
+                    return
+            if self._rate and level < self.limit_level and not self._take():
+                return
+            self._emit(level, msg)
             # msg = "{}:{}:{}".format(self._level_str(level), self.name, msg)
             # if not args:
             #     print(msg)
             # else:
             #     print(msg % args)
 
+    # use %-style args: message is formatted only for enabled level
     def debug(self, msg, *args):
-        self.log(DEBUG, msg, *args)
+        if DEBUG >= (self.level or _level):
+            self.log(DEBUG, msg, *args)
 
     def info(self, msg, *args):
         self.log(INFO, msg, *args)
@@ -68,14 +142,91 @@ class Logger:
 
     def exc(self, e, msg, *args):
         self.log(ERROR, msg, *args)
-        sys.print_exception(e, _stream)
+        if _sink is None:
+            sys.print_exception(e, _stream)
+            return
+        # traceback into the sink too: after its header line, written out in idle time
+        buf = io.StringIO()
+        sys.print_exception(e, buf)
+        _sink.emit(ERROR, self.name, buf.getvalue())
 
     def exception(self, msg, *args):
         self.exc(sys.exc_info()[1], msg, *args)
 
 
+class RingSink:
+    # preallocated ring buffer for log lines, written out by drain() task
+    # in idle time; full buffer drops lines and counts them
+
+    def __init__(self, size=2048, stream=None, level=NOTSET):
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.size = size
+        self.head = 0
+        self.tail = 0
+        self.used = 0
+        self.dropped = 0
+        self.stream = stream or _stream
+        self.level = level
+        # logger name -> level
+        self.levels = {}
+        self.hold_until = time.ticks_ms()
+
+    def setLevel(self, level, name=None):
+        if name is None:
+            self.level = level
+        else:
+            self.levels[name] = level
+
+    def emit(self, level, name, line):
+        if level >= self.levels.get(name, self.level):
+            self.write(line)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        n = len(data)
+        if n > self.size - self.used:
+            self.dropped += 1
+            return 0
+
+        first = min(n, self.size - self.head)
+        self.buf[self.head:self.head + first] = data[:first]
+        if first < n:
+            self.buf[0:n - first] = data[first:]
+        self.head = (self.head + n) % self.size
+        self.used += n
+        return n
+
+    def hold(self, ms):
+        # time critical window: no drain for ms
+        self.hold_until = time.ticks_add(time.ticks_ms(), ms)
+
+    def _out(self, data):
+        out = getattr(self.stream, "buffer", self.stream)
+        out.write(data)
+
+    async def drain(self, chunk=32, idle_ms=10):
+        import uasyncio as asyncio
+
+        while True:
+            if self.used and time.ticks_diff(time.ticks_ms(), self.hold_until) >= 0:
+                n = min(chunk, self.used, self.size - self.tail)
+                self._out(self.mv[self.tail:self.tail + n])
+                self.tail = (self.tail + n) % self.size
+                self.used -= n
+                # let other tasks run between small chunks
+                await asyncio.sleep_ms(0)
+            else:
+                if self.dropped and not self.used:
+                    dropped, self.dropped = self.dropped, 0
+                    self._out("LOG:dropped {} lines\n".format(dropped).encode())
+                await asyncio.sleep_ms(idle_ms)
+
+
 _level = INFO
 _loggers = {}
+_sink = None
 
 def getLogger(name):
     if name in _loggers:
@@ -90,6 +241,16 @@ def info(msg, *args):
 def debug(msg, *args):
     getLogger(None).debug(msg, *args)
 
+def buffered(size=2048, level=NOTSET):
+    # route all loggers to ring sink, run sink.drain() as task
+    global _sink
+    _sink = RingSink(size, _stream, level)
+    return _sink
+
+def hold(ms):
+    if _sink is not None:
+        _sink.hold(ms)
+
 def basicConfig(level=INFO, filename=None, stream=None, format=None):
     global _level, _stream
     _level = level
@@ -1,16 +1,31 @@
 
+import time
 import struct
 import binascii
 
 from scrivo.tools.tool import launch, asyncio, DataClassArg
 from machine import UART
 
-from .config import data_request, data_register_master, data_register_slave, panel_slave_addr
-from .crc import check_crc16, calc_crc16
+from .config import data_request, data_register_master, data_register_slave, panel_slave_addr, poll_max_gap
+from .config import poll_report_ms, poll_learn_ms, poll_min_ms, poll_prefetch_ms
+from .config import meter_timeout_ms, meter_margin_ms, meter_fail_max, meter_backoff_ms, meter_backoff_max_ms
+from .config import panel_idle_ms, panel_late_ms, panel_exc_unknown, panel_exc_stale
+from .crc import check_crc16, put_crc16
+from .rtu import RtuFramer, RtuStream, response_len, EXC_LEN
+from .plan import plan_blocks, member_slice, learn_requests
+from .image import RegisterImage, MAX_QTY
+from .codec import compile_act
+from .fresh import Fresh, MAX_AGE
+from .sched import PollScheduler, INTERVAL, PRIORITY
+from .demand import Demand
+from .health import UnitHealth
 
 from scrivo import logging
 log = logging.getLogger("MODBUS")
 log.setLevel(logging.DEBUG)
+# link down: summary of repeated errors, cap console lines per second
+log.suppress(10)
+log.limit(50, 100)
 
 reg_code = {
     0x01: 0,
@@ -19,12 +34,22 @@ reg_code = {
     0x04: 30001,
 }
 
+class _Hex:
+    # lazy hex dump, joined only when the log line is emitted
+
+    def __init__(self, data, sep):
+        self.data = data
+        self.sep = sep
+
+    def __str__(self):
+        try:
+            return self.sep.join('{:02x}'.format(x) for x in self.data)
+        except Exception as e:
+            return "error: HEX: {}".format(e)
+
+
 def hexh(data,  sep=' '):
-    try:
-        data = f'{sep}'.join('{:02x}'.format(x) for x in data)
-    except Exception as e:
-        log.debug("error: HEX: {}".format(e))
-    return data
+    return _Hex(data, sep)
 
 
 class Runner:
@@ -34,65 +59,120 @@ class Runner:
 
     async def _activate(self):
 
-        self.request_data = []
-        for key, value in data_request.items():
-            self.request_data.append(DataClassArg(name=key, **value))
+        self.build_requests()
 
         self.meter_uart = UART(1, baudrate=9600, tx=13, rx=14)
         self.meter_swriter = asyncio.StreamWriter(self.meter_uart, {})
-        self.meter_sreader = asyncio.StreamReader(self.meter_uart)
+        self.meter_framer = RtuFramer(self.meter_uart, baudrate=9600, timer=0)
 
         self.panel_uart = UART(2, baudrate=9600, tx=21, rx=22)
         self.panel_swriter = asyncio.StreamWriter(self.panel_uart, {})
-        self.panel_sreader = asyncio.StreamReader(self.panel_uart)
         self.panel_slave_addr = panel_slave_addr
+        self.panel_framer = RtuFramer(self.panel_uart, baudrate=9600, timer=1)
+        self.panel_stream = RtuStream(addrs=self.panel_slave_addr)
+        self.panel_cache_init()
 
         launch(self.meter_process)
         launch(self.panel_receiver)
 
 
+    def build_requests(self):
+        # poll frames are static, build once; call again after config change
+        self.request_data = []
+        for key, value in data_request.items():
+            request = DataClassArg(name=key, **value)
+            request.fresh = Fresh(value.get("max_age", MAX_AGE))
+            request.interval = value.get("interval", INTERVAL)
+            request.priority = value.get("priority", PRIORITY)
+            request.base_interval = request.interval
+            request.offset = reg_code[request.func] + request.start_reg
+            self.request_data.append(request)
+
+        # latency and circuit breaker per meter unit
+        self.meter_health = {}
+        for request in self.request_data:
+            if request.addr not in self.meter_health:
+                self.meter_health[request.addr] = UnitHealth(
+                    meter_margin_ms, meter_timeout_ms, meter_fail_max, meter_backoff_ms, meter_backoff_max_ms)
+
+        self.poll_plan = None
+        self.learn_ticks = time.ticks_ms()
+        self.plan_requests(self.request_data)
+
+    def plan_requests(self, requests):
+        # near register ranges polled as one block read
+        self.poll_blocks = plan_blocks(requests, poll_max_gap)
+        for block in self.poll_blocks:
+            # response size known from func and qty_reg
+            block.resp_len = response_len(block.func, block.qty_reg)
+            block.pdu = bytes(self.make_request(block))
+        self.poll_sched = PollScheduler(self.poll_blocks)
+        for block in self.poll_blocks:
+            if self.meter_health[block.addr].open:
+                self.poll_sched.align(block, self.meter_health[block.addr].probe_at)
+
+    def plan_learned(self, demand):
+        # poll only what the inverter reads, rebuild plan on change
+        requests = learn_requests(self.request_data, demand, poll_min_ms)
+        plan = [(request.name, request.interval) for request in requests]
+        if plan != self.poll_plan:
+            self.poll_plan = plan
+            log.info("Poll plan: %s", plan)
+            self.plan_requests(requests)
+
     def make_request(self, request):
         quantity = request.qty_reg
-        request_pdu = struct.pack('>BBHH', request.addr, request.func, request.start_reg, quantity)
+        modbus_pdu = bytearray(8)
+        struct.pack_into('>BBHH', modbus_pdu, 0, request.addr, request.func, request.start_reg, quantity)
         # debug
-        log.debug(f"  Pdu Reguest : {hexh(request_pdu)}")
+        log.debug("  Pdu Reguest : %s", hexh(modbus_pdu[:6]))
 
-        modbus_pdu = bytearray()
-        modbus_pdu.extend(request_pdu)
-        modbus_pdu.extend(calc_crc16(request_pdu))
+        put_crc16(modbus_pdu, 6)
         # debug
-        log.debug(f"  Pdu UART : {hexh(modbus_pdu)}")
+        log.debug("  Pdu UART : %s", hexh(modbus_pdu))
         log.debug(" ")
 
         return modbus_pdu
 
-    def parse_response(self, request, data):
-        log.debug(f"<<recv: {hexh(data)}")
-        if data[0] != request.addr or data[1] != request.func:
+    def parse_response(self, block, data):
+        log.debug("<<recv: %s", hexh(data))
+        if len(data) < EXC_LEN or data[0] != block.addr or data[1] != block.func:
             return None
 
-        crc, req_data = check_crc16(data)
-        if crc:
-            unit_addr, reg_func, byte_qty = struct.unpack_from('BBB', req_data, 0)
-            request_offset = reg_code[reg_func] + request.start_reg
-            # DEBUG
-            log.debug(
-                f"unit_addr: {unit_addr}, reg_offset: {request_offset}, byte_qty: {byte_qty}, data: {hexh(req_data)}")
+        if check_crc16(data):
+            unit_addr, reg_func, byte_qty = struct.unpack_from('BBB', data, 0)
 
-            if request_offset in data_register_master:
-                data_master = data_register_master[request_offset]
-            else:
-                data_register_master[request_offset] = {}
-                data_master = data_register_master[request_offset]
-                data_master['act'] = None
+            # split block response to request records
+            for request in block.members:
+                start, end = member_slice(block, request)
+                request_offset = reg_code[reg_func] + request.start_reg
+                # DEBUG
+                log.debug(
+                    "unit_addr: %s, reg_offset: %s, byte_qty: %s, data: %s", unit_addr, request_offset, byte_qty, hexh(data))
+
+                if request_offset in data_register_master:
+                    data_master = data_register_master[request_offset]
+                else:
+                    data_register_master[request_offset] = {}
+                    data_master = data_register_master[request_offset]
+                    data_master['act'] = None
+                    data_master['codec'] = None
+                    data_master['fresh'] = Fresh()
+                    data_master['demand'] = Demand()
+
+                raw = bytes(data[start:end])
+                log.debug("<<recv value data: %s", hexh(raw))
+                data_master["fresh"].touch()
+                data_master["raw"] = raw
 
-            data = req_data[3:]
-            log.debug(f"<<recv value data: {hexh(data)}")
-            data_master["alive"] = 10
-            data_master["raw"] = data
+                if data_master["codec"] is not None:
+                    data_master["value"] = data_master["codec"].decode(raw)
 
-            if data_master["act"] is not None:
-                data_master["value"] = self._act(data_master["raw"], **data_master["act"])
+                # rebuild inverter responses fed by this record
+                self.panel_cache_update(request_offset)
+
+                request.fresh.touch()
+                request.raw = raw
 
             log.debug(" ")
             return True
@@ -100,56 +180,149 @@ class Runner:
     async def meter_process(self):
 
         while True:
-            for request in self.request_data:
-                request.alive -= 1
-                uart_pdu = self.make_request(request)
-                if uart_pdu is not None:
-                    # send request to unit
-                    await self.meter_swriter.awrite(uart_pdu)
-
-                    await asyncio.sleep(0.2)
-                    data = b''
-
-                    # wait for response and read it
-                    try:
-                        data = await asyncio.wait_for(self.meter_sreader.read_uart(-1), 1)
-                    except asyncio.TimeoutError:
-                        log.error('Meter got timeout')
-                    # log.info(f" << uart {'Meter'}: {hexh(data)}")
-
-                    if data != b'':
-                        # parse response data
-                        if self.parse_response(request, data):
-                            request.alive = 10
-                            request.raw = data  # response full.
-            await asyncio.sleep(0.1)
+            block = None
+            try:
+                # next due block by deadline and priority, else sleep to the nearest deadline
+                sched = self.poll_sched
+                block, wait = sched.next(time.ticks_ms())
+                if block is None:
+                    await sched.sleep(wait)
+                    continue
+
+                # send request to unit
+                health = self.meter_health[block.addr]
+                start = time.ticks_ms()
+                self.meter_framer.flush()
+                await self.meter_swriter.awrite(block.pdu)
+                sent = time.ticks_ms()
+
+                # wait for response: exactly resp_len bytes, or exception frame, unit timeout from its latency
+                data = await self.meter_framer.read(block.resp_len, health.timeout)
+                # log.info(f" << uart {'Meter'}: {hexh(data)}")
+
+                ok = False
+                if not len(data):
+                    log.error('Meter got timeout')
+                else:
+                    # parse response data
+                    ok = bool(self.parse_response(block, data))
+
+                now = time.ticks_ms()
+                sched.done(block, now, ok, time.ticks_diff(now, start))
+                self.meter_check(block.addr, health, len(data) and check_crc16(data), time.ticks_diff(now, sent), now)
+                # open circuit: block waits for its probe, not for the inverter
+                if poll_prefetch_ms is not None and not health.open:
+                    self.poll_align(block, now)
+                if time.ticks_diff(now, sched.since) >= poll_report_ms:
+                    self.poll_report(now)
+                if poll_learn_ms and time.ticks_diff(now, self.learn_ticks) >= poll_learn_ms:
+                    self.poll_learn(now)
+            except Exception as e:
+                log.error("METER: {}".format(e))
+                if block is not None:
+                    # failed poll, block keeps its cadence
+                    self.poll_sched.done(block, time.ticks_ms(), False)
+
+            # bus silence before next request
+            await asyncio.sleep_ms(self.meter_framer.gap_ms)
+
+    def poll_align(self, block, now):
+        # next read to finish just before the inverter is expected to ask again
+        for request in block.members:
+            data_master = data_register_master.get(request.offset)
+            if data_master is None or "demand" not in data_master:
+                continue
+            demand = data_master["demand"]
+            if demand.interval and demand.active(now, 2 * demand.interval):
+                lead = block.took + poll_prefetch_ms
+                self.poll_sched.align(block, time.ticks_add(demand.next(now, lead), -lead))
+                return
+
+    def poll_learn(self, now):
+        # read rate of every polled record in the last window
+        self.learn_ticks = now
+        demand = {}
+        for request in self.request_data:
+            data_master = data_register_master.get(request.offset)
+            if data_master is not None and data_master["demand"].active(now, poll_learn_ms):
+                demand[request.offset] = data_master["demand"].interval or 0
+        self.plan_learned(demand)
+
+    def meter_check(self, addr, health, answered, latency, now):
+        # any valid frame counts as answer, exception too
+        if answered:
+            if health.ok(latency):
+                log.info("Meter unit %s back", addr)
+            return
+        if health.fail(now):
+            # circuit open: unit blocks wait for probe, other units keep their rate
+            log.warning("Meter unit %s down, probe in %s ms", addr, health.backoff)
+            for block in self.poll_blocks:
+                if block.addr == addr:
+                    self.poll_sched.align(block, health.probe_at)
+
+    def poll_report(self, now):
+        # realised against target poll rate per request
+        for name, target, real, fails in self.poll_sched.rates(now):
+            log.info("Poll %s: %.2f Hz of %.2f, fails: %s", name, real, target, fails)
+        for addr, health in self.meter_health.items():
+            log.info("Meter unit %s: timeout %s ms, open: %s", addr, health.timeout, health.open)
+        self.poll_sched.reset(now)
 
 
     async def panel_receiver(self):
+        # port is read all the time: no sleep on idle, requests never wait unread
+        stats = self.panel_stats = {"requests": 0, "answered": 0, "exceptions": 0, "missed": 0, "late": 0}
+        stream = self.panel_stream
+        last = time.ticks_ms()
+        idle = False
 
         while True:
             try:
-                data = b''
-                try:  # wait for response and read it
-                    data = await asyncio.wait_for(self.panel_sreader.read_uart(-1), 1)
-                except asyncio.TimeoutError:
-                    log.debug('Panel got timeout')
-                    await asyncio.sleep(5)
-                    # emu for dev
-                    # data = self.panel_emu()
-
-                if data != b'':
-                    pdu_response = self.panel_request_decode(data)
-                    if pdu_response is not None:
-                        await self.panel_swriter.awrite(pdu_response)
+                data = await self.panel_framer.read(0, 1000, 5 if idle else 1)
+
+                if not len(data):
+                    stream.reset()
+                    # idle detection, only slower polling of rx buffer
+                    if not idle and time.ticks_diff(time.ticks_ms(), last) > panel_idle_ms:
+                        idle = True
+                        log.info("Panel idle, stats: %s, skipped bytes: %s", stats, stream.skipped)
+                    continue
+
+                received = time.ticks_ms()
+                last = received
+                idle = False
+
+                # split, joined or noisy reads: every complete request in order
+                stream.feed(data)
+                while True:
+                    request = stream.pop()
+                    if request is None:
+                        break
+                    if request[0] not in self.panel_slave_addr:
+                        continue
+
+                    # no log drain until response is sent
+                    logging.hold(50)
+                    stats["requests"] += 1
+                    pdu_response = self.panel_request_decode(request)
+                    if pdu_response is None:
+                        stats["missed"] += 1
+                        continue
+
+                    await self.panel_swriter.awrite(pdu_response)
+                    stats["answered"] += 1
+                    if pdu_response[1] & 0x80:
+                        stats["exceptions"] += 1
+                    if time.ticks_diff(time.ticks_ms(), received) > panel_late_ms:
+                        stats["late"] += 1
             except Exception as e:
                 log.error("PANEL: {}".format(e))
 
     def panel_request_decode(self, request):
-        value_byte = None
         # DEBUG
         log.debug(" ")
-        log.debug(f" << uart request: {hexh(request)} - {len(request)}")
+        log.debug(" << uart request: %s - %s", hexh(request), len(request))
 
         if len(request) < 8:
             return None
@@ -157,99 +330,168 @@ class Runner:
         if request[0] not in self.panel_slave_addr:
             return None
 
-        crc, request_data = check_crc16(request)
+        # function first: write requests are longer than 8 bytes, frame crc checked by RtuStream
+        if request[1] not in reg_code:
+            # 0x01 illegal function
+            return self.make_exc_response(request[0], request[1], 0x01)
+
+        crc = check_crc16(request, 0, 8)
         # DEBUG
-        log.debug(f"       crc check: {hexh(crc)}")
+        log.debug("       crc check: %s", crc)
 
         if crc:
             # Request param
-            unit_addr, reg_func, reg_addr, qty = struct.unpack_from('>BBHH', request_data, 0)  # 00: 00 : 00 00 : 00 00
+            unit_addr, reg_func, reg_addr, qty = struct.unpack_from('>BBHH', request, 0)  # 00: 00 : 00 00 : 00 00
             # DEBUG
-            log.debug(f"   addr: {unit_addr}, func: {reg_func}, reg_addr: {reg_addr}, qty: {qty} ")
+            log.debug("   addr: %s, func: %s, reg_addr: %s, qty: %s ", unit_addr, reg_func, reg_addr, qty)
 
             # Calc offset
             reguest_offset = reg_code[reg_func]+reg_addr
             # DEBUG
-            log.debug(f"   offset: {reguest_offset}")
-
-            # Check if reguest exist, that map for request.
-            if reguest_offset in data_register_slave:
-                data_slave = data_register_slave[reguest_offset]
-                master_offset = data_slave["master"]
-
-                # if data exist in data_register_master
-                if master_offset in data_register_master:
-                    data_master = data_register_master[master_offset]
-
-                    # DEBUG
-                    log.debug(f"   - alive: {data_master['alive']}")
-
-                    # get value if data alive
-                    if data_master["alive"] >= 5:
-                        data_master["alive"] -= 1
-                        # get value from master record and conver for rigt response
-                        if data_slave["act"] is not None:
-                            value_byte = self._act(data_master["value"], **data_slave["act"])
-                        # get value from master record, that is raw data from device
-                        else:
-                            value_byte = data_master["raw"]
-                            # DEBUG
-                            log.debug(f"   Modbus raw: {hexh(value_byte)}")
-                            return value_byte
-
-                # if -1, get value from action == emulate response
-                elif master_offset == -1:
-                    value_byte = self._act(**data_slave["act"])
-
-            return self.make_pdu_response(unit_addr, reg_func, value_byte)
-
-    def _act(self, value=None, **act):
-        # DEBUG
-        log.debug(f"   act : {act}")
+            log.debug("   offset: %s", reguest_offset)
 
-        if value is None:
-            value = act["value"]
-        # DEBUG
-        log.debug(f"   value: {value}")
-
-        # pack value to bytes
-        if "pack" in act:
-            # convert value
-            if "data_type" in act:
-                data_type = act["data_type"]
-                if data_type == "int":
-                    value = int(value)
-                if data_type == "float":
-                    value = float(value)
-                value * act["scale"]
-                # DEBUG
-                log.debug(f"   value convert: {value}")
+            # prebuilt response for request offset and unit, if qty match
+            entry = self.panel_pdu.get(reguest_offset << 8 | unit_addr)
+            if entry is not None and len(entry[0]) == 5 + 2 * qty:
+                pdu, data_master, exc_pdu = entry
 
-            value_byte = struct.pack(act["pack"], value)
-            # pack to len_byte+value_byte
-            value = struct.pack("B", len(value_byte)) + value_byte
-            # DEBUG
-            log.debug(f"   act bytes: {hexh(value)}")
+                # emulated response, always valid
+                if data_master is None:
+                    return pdu
 
-        if "unpack" in act:
-            value = struct.unpack(act["unpack"], value)[0]
-            # DEBUG
-            log.debug(f"   act value: {value}")
+                # learn what the inverter reads and how often
+                data_master["demand"].hit()
+
+                # DEBUG
+                log.debug("   - age: %s", data_master["fresh"].age())
+
+                # get response if data not older than max_age
+                if data_master["fresh"].ok():
+                    return pdu
+                # fast negative reply by register policy
+                return exc_pdu
+
+            # any other FC03/FC04 range, served from register image
+            data = self.panel_image.read(reg_func, reg_addr, qty)
+            if data is None:
+                return self.make_exc_response(unit_addr, reg_func, panel_exc_unknown)
+            for data_master in self.panel_image.records(reg_func, reg_addr, qty):
+                data_master["demand"].hit()
+            # register policy of first stale record
+            span = self.panel_image.stale(reg_func, reg_addr, qty)
+            if span is not None:
+                return self.make_exc_response(unit_addr, reg_func, span[3])
+            return self.make_image_response(unit_addr, reg_func, data)
+
+    def panel_cache_init(self):
+        # response cache key: offset << 8 | unit_addr, value: (pdu, data_master, exception pdu)
+        self.panel_pdu = {}
+        # exception cache key: code << 16 | func << 8 | unit_addr
+        self.panel_exc = {}
+        # register image per func, answer any range of configured registers
+        self.panel_image = RegisterImage()
+        self.panel_tx = bytearray(2 * MAX_QTY + 5)
+        # value converters compiled once from act, time based freshness
+        for data_master in data_register_master.values():
+            data_master["codec"] = compile_act(data_master["act"])
+            data_master["fresh"] = Fresh(data_master.get("max_age", MAX_AGE))
+            data_master["demand"] = Demand()
+
+        # master offset -> slave offsets fed by it
+        self.slave_map = {}
+        for offset, data_slave in data_register_slave.items():
+            data_slave["codec"] = compile_act(data_slave["act"])
+            master_offset = data_slave["master"]
+            if master_offset not in self.slave_map:
+                self.slave_map[master_offset] = []
+            self.slave_map[master_offset].append(offset)
+
+            func = data_slave["func"]
+            if func in (0x03, 0x04):
+                if "qty" in data_slave:
+                    qty = data_slave["qty"]
+                else:
+                    qty = data_slave["codec"].size // 2
+                self.panel_image.add(func, offset - reg_code[func], qty, data_register_master.get(master_offset),
+                                     data_slave.get("stale", panel_exc_stale))
+        self.panel_image.build()
+
+        # emulated responses (master: -1) are static, build once
+        self.panel_cache_update(-1)
+
+    def panel_cache_update(self, master_offset):
+        data_master = data_register_master.get(master_offset)
+
+        for offset in self.slave_map.get(master_offset, ()):
+            data_slave = data_register_slave[offset]
+            codec = data_slave["codec"]
+
+            # if -1, get value from codec == emulate response
+            if data_master is None:
+                value_byte = codec.encode()
+            # get value from master record and conver for rigt response
+            elif codec is not None:
+                value_byte = codec.encode(data_master["value"])
+            # raw register data from device
+            else:
+                value_byte = data_master["raw"]
+
+            for unit_addr in self.panel_slave_addr:
+                # byte_qty+data
+                pdu = self.make_pdu_response(unit_addr, data_slave["func"], struct.pack("B", len(value_byte)) + value_byte)
+                exc_pdu = self.make_exc_response(unit_addr, data_slave["func"], data_slave.get("stale", panel_exc_stale))
+                self.panel_pdu[offset << 8 | unit_addr] = (bytes(pdu), data_master, exc_pdu)
 
-        return value
+            self.panel_image.write(data_slave["func"], offset - reg_code[data_slave["func"]], value_byte)
 
     def make_pdu_response(self, unit_addr, reg_func, value_byte):
         if value_byte is not None:
             # DEBUG
-            log.debug(f"  Modbus data:      {hexh(value_byte)}")
+            log.debug("  Modbus data:      %s", hexh(value_byte))
 
-            modbus_pdu = bytearray()
-            modbus_pdu.append(unit_addr)                    # unit_addr
-            modbus_pdu.extend(struct.pack('B', reg_func))   # reg_func
-            modbus_pdu.extend(value_byte)                   # value_byte
-            modbus_pdu.extend(calc_crc16(modbus_pdu))       # crc
+            end = len(value_byte) + 2
+            modbus_pdu = bytearray(end + 2)
+            modbus_pdu[0] = unit_addr                       # unit_addr
+            modbus_pdu[1] = reg_func                        # reg_func
+            modbus_pdu[2:end] = value_byte                  # value_byte
+            put_crc16(modbus_pdu, end)                      # crc
 
             # DEBUG
-            log.debug(f"  Modbus Pdu: {hexh(modbus_pdu)}")
+            log.debug("  Modbus Pdu: %s", hexh(modbus_pdu))
 
             return modbus_pdu
+
+    def make_image_response(self, unit_addr, reg_func, data):
+        # one copy from image to preallocated tx buffer
+        end = len(data) + 3
+        modbus_pdu = self.panel_tx
+        modbus_pdu[0] = unit_addr
+        modbus_pdu[1] = reg_func
+        modbus_pdu[2] = len(data)
+        modbus_pdu[3:end] = data
+        put_crc16(modbus_pdu, end)
+
+        # DEBUG
+        log.debug("  Modbus Pdu: %s", hexh(modbus_pdu[:end + 2]))
+
+        return memoryview(modbus_pdu)[:end + 2]
+
+    def make_exc_response(self, unit_addr, reg_func, code):
+        # exception pdu: addr, func | 0x80, code, crc; code None: no reply
+        if code is None:
+            return None
+
+        key = code << 16 | reg_func << 8 | unit_addr
+        modbus_pdu = self.panel_exc.get(key)
+        if modbus_pdu is None:
+            buf = bytearray(5)
+            buf[0] = unit_addr
+            buf[1] = reg_func | 0x80
+            buf[2] = code
+            put_crc16(buf, 3)
+            modbus_pdu = self.panel_exc[key] = bytes(buf)
+
+        # DEBUG
+        log.debug("  Modbus exception: %s", hexh(modbus_pdu))
+
+        return modbus_pdu
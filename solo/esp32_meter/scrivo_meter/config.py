@@ -1,11 +1,13 @@
-
+# "interval": ms target poll interval, default 1000
+# "priority": of due polls the higher one goes first, default 0
 data_request = {
     "watt_eastron": {
         "addr": 1,
         "func": 4,
         "start_reg": 12,
         "qty_reg": 2,
-        "alive": 0,
+        "interval": 250,
+        "priority": 2,
         "raw": 0x00,
     },
 
@@ -14,23 +16,46 @@ data_request = {
         "func": 3,
         "start_reg": 8192,
         "qty_reg": 6,
-        "alive": 0,
+        "interval": 1000,
+        "priority": 1,
         "raw": 0x00,
     }
 }
 
+# merge polls on same unit/func if gap between ranges <= poll_max_gap registers
+poll_max_gap = 10
+# log realised poll rates every poll_report_ms
+poll_report_ms = 60000
+# learn from inverter reads: poll only read registers at their read rate, re-planned every poll_learn_ms
+# 0: poll all of data_request as configured
+poll_learn_ms = 30000
+# fastest learned poll interval, ms
+poll_min_ms = 100
+# poll to finish this many ms before the inverter is expected to read, learned period and phase
+# None: fixed interval grid
+poll_prefetch_ms = 20
+
+# meter response timeout: p99 of unit latency + meter_margin_ms, at most meter_timeout_ms
+meter_timeout_ms = 1000
+meter_margin_ms = 50
+# meter_fail_max failures in a row: unit skipped, probed after meter_backoff_ms, doubled up to meter_backoff_max_ms
+meter_fail_max = 3
+meter_backoff_ms = 1000
+meter_backoff_max_ms = 60000
+
+# "max_age": ms a value stays valid after meter update, default 5000
 data_register_master = {
     # eastron watt : reply from "addr": 1, "func": 4, "start_reg": 12, "qty_reg": 2: - act for convert to float watt
     30013: {
-        "alive": 0,
+        "max_age": 5000,
         "raw": b'\x00',
         "value": 0,
-        "act": {"unpack": ">f", "scale": 1, "unit": "W", },
+        "act": {"type": "float32", "scale": 1, "unit": "W"},
     },
 
     # deye chint 1p : reply from "addr": 1, "func": 3, "start_reg": 8192, "qty_reg": 6: leave as is for Deye invertor
     48193: {
-        "alive": 0,
+        "max_age": 5000,
         "raw": b'\x00',
         "value": 0,
         "act": None,
@@ -44,29 +69,40 @@ data_register_slave = {
     40015: {
         "master": 30013,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "data_type": "int"}
+        "act": {"type": "int16", "scale": 1}
     },
 
     # solax ask from: func 03,  00 0b = 11+1 = offset 40012:    Solax ask init.
     40012: {
         "master": -1,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "value": 0}
+        "act": {"type": "int16", "value": 0}
     },
 
     # solax ask from: func 03, 8+1 =           offset 40009:    Solax ask init.
     40009: {
         "master": -1,
         "func": 0x03,
-        "act": {"pack": ">h", "scale": 1, "value": 0}
+        "act": {"type": "int16", "value": 0}
     },
 
     # daye ask from: func 03, 00 0e = 14+1 = offset 48193:      Deye ask watts send as is.
     48193: {
         "master": 48193,
         "func": 0x03,
+        "qty": 6,
         "act": None
     },
 }
 
 panel_slave_addr = [1]
+
+# no request for panel_idle_ms: panel idle, response later than panel_late_ms: late
+panel_idle_ms = 5000
+panel_late_ms = 100
+
+# modbus exception reply, None: no reply
+# register not configured: 0x02 illegal data address
+panel_exc_unknown = 0x02
+# master data older than "max_age" ms: 0x0B gateway target failed to respond, per register: "stale" in data_register_slave
+panel_exc_stale = 0x0B
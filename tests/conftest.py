@@ -0,0 +1,50 @@
+# Host tests for the MicroPython modules: small shims for uasyncio, machine, aioespnow and time.ticks_*.
+# Shared modules are identical in every deploy directory, solo and the espnow client and server copies are tested.
+
+import os
+import sys
+import time
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    os.path.join(ROOT, "tests", "shim"),
+    os.path.join(ROOT, "solo", "esp32_meter"),
+    os.path.join(ROOT, "espnow", "solax_chint_1p", "meter_client"),
+    os.path.join(ROOT, "espnow", "solax_chint_1p", "meter_server"),
+    os.path.join(ROOT, "tools"),
+]
+
+_PERIOD = 0x40000000
+_t0 = time.monotonic_ns()
+
+
+def _ticks_ms():
+    return ((time.monotonic_ns() - _t0) // 1000000) & (_PERIOD - 1)
+
+
+def _ticks_us():
+    return ((time.monotonic_ns() - _t0) // 1000) & (_PERIOD - 1)
+
+
+def _ticks_add(a, b):
+    return (a + b) & (_PERIOD - 1)
+
+
+def _ticks_diff(a, b):
+    d = (a - b) & (_PERIOD - 1)
+    return d - _PERIOD if d & (_PERIOD >> 1) else d
+
+
+def _print_exception(e, file=sys.stdout):
+    traceback.print_exception(type(e), e, e.__traceback__, file=file)
+
+
+if not hasattr(sys, "print_exception"):
+    sys.print_exception = _print_exception
+
+if not hasattr(time, "ticks_ms"):
+    time.ticks_ms = _ticks_ms
+    time.ticks_us = _ticks_us
+    time.ticks_add = _ticks_add
+    time.ticks_diff = _ticks_diff
@@ -0,0 +1,26 @@
+# aioespnow stand-in: sent messages recorded, received ones from inbox
+
+
+class AIOESPNow:
+
+    def __init__(self):
+        self.sent = []
+        self.inbox = []
+
+    def active(self, flag):
+        pass
+
+    def add_peer(self, peer):
+        pass
+
+    async def asend(self, peer, msg, sync=True):
+        self.sent.append((peer, bytes(msg)))
+        return True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.inbox:
+            raise StopAsyncIteration
+        return self.inbox.pop(0)
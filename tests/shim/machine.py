@@ -0,0 +1,63 @@
+# machine.UART stand-in: bytes fed by the test, rx idle irq on feed, writes recorded
+
+
+class UART:
+
+    IRQ_RXIDLE = 0x1000
+
+    def __init__(self, *args, **kwargs):
+        self.rx = bytearray()
+        self.tx = []
+        self.handler = None
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self.handler = handler
+
+    def feed(self, data):
+        self.rx.extend(data)
+        if self.handler is not None:
+            self.handler(self)
+
+    def any(self):
+        return len(self.rx)
+
+    def readinto(self, buf, nbytes=None):
+        n = min(len(buf), len(self.rx))
+        if nbytes is not None:
+            n = min(n, nbytes)
+        if not n:
+            return None
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def write(self, data):
+        self.tx.append(bytes(data))
+        return len(data)
+
+
+class Timer:
+    # one-shot and periodic callbacks on the running event loop
+
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1):
+        self.handle = None
+
+    def init(self, mode=PERIODIC, period=-1, callback=None):
+        import asyncio
+
+        self.deinit()
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            self.handle = loop.call_later(period / 1000, fire) if mode == Timer.PERIODIC else None
+            callback(self)
+
+        self.handle = loop.call_later(period / 1000, fire)
+
+    def deinit(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
@@ -0,0 +1,37 @@
+# uasyncio api used by the gateway, on CPython asyncio
+
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+
+
+def sleep_ms(ms):
+    return _asyncio.sleep(ms / 1000)
+
+
+def wait_for_ms(aw, ms):
+    return _asyncio.wait_for(aw, ms / 1000)
+
+
+class ThreadSafeFlag:
+
+    def __init__(self):
+        self._event = _asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+class StreamWriter:
+
+    def __init__(self, stream, extra=None):
+        self.stream = stream
+
+    async def awrite(self, data):
+        self.stream.write(bytes(data))
@@ -0,0 +1,35 @@
+import math
+
+from scrivo_meter.codec import compile_act
+
+
+def test_roundtrip():
+    codec = compile_act({"type": "int32", "swap": "word", "scale": 10})
+    data = codec.encode(12.34)
+    assert len(data) == 4
+    assert codec.decode(data) == 1230
+
+
+def test_legacy_pack():
+    codec = compile_act({"pack": "<f"})
+    assert codec.fmt == "<f"
+    assert codec.decode(codec.encode(1.5)) == 1.5
+
+
+def test_int_saturates():
+    codec = compile_act({"type": "int16"})
+    assert codec.decode(codec.encode(40000)) == 0x7FFF
+    assert codec.decode(codec.encode(-40000)) == -0x8000
+
+
+def test_int_non_finite():
+    codec = compile_act({"type": "uint16"})
+    assert codec.decode(codec.encode(math.inf)) == 0xFFFF
+    assert codec.decode(codec.encode(-math.inf)) == 0
+    assert codec.decode(codec.encode(math.nan)) == 0
+
+
+def test_float_non_finite():
+    codec = compile_act({"type": "float32"})
+    assert math.isinf(codec.decode(codec.encode(math.inf)))
+    assert math.isnan(codec.decode(codec.encode(math.nan)))
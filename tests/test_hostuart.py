@@ -0,0 +1,79 @@
+import asyncio
+
+from scrivo_meter import hostuart
+from scrivo_meter.crc import put_crc16
+from scrivo_meter.rtu import RtuFramer
+
+
+def frame(*data):
+    buf = bytearray(len(data) + 2)
+    buf[:len(data)] = bytes(data)
+    put_crc16(buf, len(data))
+    return bytes(buf)
+
+
+REPLY = frame(0x01, 0x03, 0x04, 0x00, 0x01, 0x00, 0x02)
+READ = frame(0x01, 0x03, 0x00, 0x00, 0x00, 0x02)
+
+
+def test_irq_after_idle():
+    async def main():
+        host, dev = hostuart.PipeUART.pair()
+        events = []
+        dev.irq(lambda uart: events.append(uart.any()), dev.IRQ_RXIDLE)
+        host.write(READ)
+        await asyncio.sleep(0)
+        before = dev.any()
+        await asyncio.sleep(0.05)
+        return before, events
+
+    before, events = asyncio.run(main())
+    assert before == 0
+    assert events == [len(READ)]
+
+
+def test_back_to_back_one_idle():
+    async def main():
+        host, dev = hostuart.PipeUART.pair()
+        events = []
+        dev.irq(lambda uart: events.append(uart.any()), dev.IRQ_RXIDLE)
+        host.write(READ)
+        host.write(REPLY)
+        await asyncio.sleep(0.06)
+        return bytes(dev.rx), events
+
+    rx, events = asyncio.run(main())
+    assert rx == READ + REPLY
+    assert events == [len(READ) + len(REPLY)]
+
+
+def test_framer_timer_wait():
+    # rx idle flag and one-shot timer on the same flag
+    async def main():
+        host, dev = hostuart.PipeUART.pair()
+        framer = RtuFramer(dev, timer=0)
+        assert framer.timer is not None
+        nothing = bytes(await framer.read(timeout_ms=20))
+        host.write(REPLY)
+        first = bytes(await framer.read(timeout_ms=200))
+        host.write(READ)
+        second = bytes(await framer.read(expected=len(READ), timeout_ms=200))
+        return nothing, first, second
+
+    assert asyncio.run(main()) == (b"", REPLY, READ)
+
+
+def test_framer_no_timer():
+    async def main():
+        host, dev = hostuart.PipeUART.pair()
+        framer = RtuFramer(dev)
+        assert framer.timer is None
+        host.write(REPLY)
+        return bytes(await framer.read(timeout_ms=200))
+
+    assert asyncio.run(main()) == REPLY
+
+
+def test_bench():
+    assert asyncio.run(hostuart.bench(frames=3)) >= 0
+    assert asyncio.run(hostuart.bench(frames=3, irq=False)) >= 0
@@ -0,0 +1,150 @@
+from scrivo_meter_client.link import (
+    DROP, LATE, NEW, WINDOW, AckWindow, SeqTracker,
+    pack_ack, pack_head, pack_record, record_len, unpack_ack, unpack_head, unpack_records,
+    HEAD_LEN, CRC_LEN, ESPNOW_MAX, RECORD_MAX,
+)
+
+
+def test_seq_in_order():
+    seq = SeqTracker()
+    for k in range(5):
+        assert seq.update(7, k, 0, 0) == NEW
+    assert seq.received == 5
+    assert seq.lost == 0
+    assert seq.seen == 0x1F
+
+
+def test_seq_gap_and_late():
+    seq = SeqTracker()
+    seq.update(7, 10, 0, 0)
+    assert seq.update(7, 13, 0, 0) == NEW
+    assert seq.lost == 2
+    assert seq.update(7, 12, 0, 0) == LATE
+    assert seq.lost == 1
+    assert seq.reordered == 1
+    assert seq.update(7, 12, 0, 0) == DROP
+    assert seq.update(7, 13, 0, 0) == DROP
+    assert seq.duplicates == 2
+
+
+def test_seq_wrap():
+    seq = SeqTracker()
+    seq.update(7, 0xFFFE, 0, 0)
+    assert seq.update(7, 0xFFFF, 0, 0) == NEW
+    assert seq.update(7, 1, 0, 0) == NEW
+    assert seq.lost == 1
+    assert seq.update(7, 0, 0, 0) == LATE
+
+
+def test_seq_far_back():
+    # older than the bitmap: too late, not a restart
+    seq = SeqTracker()
+    seq.update(7, 1000, 0, 0)
+    assert seq.update(7, 1000 - WINDOW, 0, 0) == DROP
+    assert seq.expired == 1
+    assert seq.restarts == 0
+    assert seq.top == 1000
+
+
+def test_seq_far_ahead():
+    # jump beyond the bitmap: all between lost
+    seq = SeqTracker()
+    seq.update(7, 10, 0, 0)
+    assert seq.update(7, 10 + 100, 0, 0) == NEW
+    assert seq.lost == 99
+    assert seq.seen == 1
+    assert seq.update(7, 10 + 99, 0, 0) == LATE
+    assert seq.lost == 98
+    assert seq.restarts == 0
+
+
+def test_seq_epoch_restart():
+    # sender reboot: new seqs from 0 are new, not duplicates
+    seq = SeqTracker()
+    for k in range(10):
+        seq.update(7, k, 0, 0)
+    assert seq.update(8, 0, 0, 0) == NEW
+    assert seq.update(8, 1, 0, 0) == NEW
+    assert seq.restarts == 1
+    assert seq.duplicates == 0
+    assert (seq.epoch, seq.top, seq.seen) == (8, 1, 0b11)
+
+
+def test_seq_jitter():
+    seq = SeqTracker()
+    seq.update(7, 0, 100, 110)
+    seq.update(7, 1, 200, 205)
+    seq.update(7, 2, 300, 325)
+    assert seq.delay == 5
+    assert seq.jitter == 20
+
+
+def test_ack_window():
+    acks = AckWindow(size=4, retries=2, rto_min=20, rto_max=1000)
+    for k in range(3):
+        acks.add(k, b"peer", bytes([k]), 0)
+    acks.ack(2, 0b101, 30)
+    assert sorted(acks.flight) == [1]
+    assert acks.acked == 2
+    assert acks.srtt == 30
+
+
+def test_ack_window_resend():
+    acks = AckWindow(size=4, retries=2, rto_min=20, rto_max=1000)
+    acks.add(7, b"peer", b"m", 0)
+    resend, wait = acks.due(0)
+    assert resend == []
+    assert wait == acks.rto
+    resend, wait = acks.due(acks.rto)
+    assert resend == [(b"peer", b"m")]
+    assert wait == 2 * acks.rto
+    resend, wait = acks.due(3 * acks.rto)
+    assert resend == [(b"peer", b"m")]
+    resend, wait = acks.due(7 * acks.rto)
+    assert resend == []
+    assert acks.flight == {}
+    assert acks.resent == 2
+    assert acks.dropped == 1
+
+
+def test_ack_window_full():
+    acks = AckWindow(size=2)
+    acks.add(0xFFFF, b"p", b"a", 0)
+    acks.add(0, b"p", b"b", 0)
+    acks.add(1, b"p", b"c", 0)
+    assert sorted(acks.flight) == [0, 1]
+    assert acks.dropped == 1
+
+
+def test_ack_resent_no_rtt():
+    acks = AckWindow()
+    acks.add(1, b"p", b"a", 0)
+    acks.due(acks.rto)
+    acks.ack(1, 1, 500)
+    assert acks.srtt is None
+    assert acks.acked == 1
+
+
+def test_messages():
+    assert unpack_ack(pack_ack(9, 5, 0b11)) == (9, 5, 0b11)
+    buf = bytearray(HEAD_LEN)
+    pack_head(buf, 9, 0x12345, 77)
+    assert unpack_head(buf) == (9, 0x2345, 77)
+    rec, at = pack_record(3, 6, b"\x00\x01", "int16")
+    raw, _ = pack_record(4, 0xFFF0, b"\x01\x02\x03\x04", "float")
+    msg = bytes(buf) + rec + raw + b"\x00" * CRC_LEN
+    records = list(unpack_records(msg))
+    assert records[0][:3] == (3, 6, 1)
+    assert msg[records[0][3]:records[0][4]] == b"\x00\x01"
+    assert records[1][:3] == (4, 0xFFF0, 0)
+    assert msg[records[1][3]:records[1][4]] == b"\x01\x02\x03\x04"
+    assert len(rec) == record_len(2, "int16")
+    assert len(raw) == record_len(4, "float")
+
+
+def test_record_limit():
+    # largest raw record still fits one message
+    data = bytes(RECORD_MAX - 5)
+    assert record_len(len(data)) == RECORD_MAX
+    rec, at = pack_record(3, 0, data)
+    assert HEAD_LEN + len(rec) + CRC_LEN == ESPNOW_MAX
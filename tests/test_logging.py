@@ -0,0 +1,49 @@
+import io
+
+from scrivo import logging
+
+
+def make(monkeypatch, name):
+    stream = io.StringIO()
+    monkeypatch.setattr(logging, "_stream", stream)
+    log = logging.Logger(name)
+    log.setLevel(logging.DEBUG)
+    return log, stream
+
+
+def test_limit_spares_warnings(monkeypatch):
+    log, stream = make(monkeypatch, "limit")
+    log.limit(1, 2)
+    for k in range(10):
+        log.debug("debug %s", k)
+    log.error("error")
+    log.warning("warning")
+    lines = stream.getvalue().splitlines()
+    assert lines == ["DEBUG:limit:debug 0", "DEBUG:limit:debug 1", "ERROR:limit:error", "WARN:limit:warning"]
+    assert log.limited == 8
+
+
+def test_suppress_repeats(monkeypatch):
+    log, stream = make(monkeypatch, "repeat")
+    log.suppress(10)
+    for k in range(3):
+        log.error("link down")
+    log.info("info")
+    log.info("info")
+    assert stream.getvalue().splitlines() == ["ERROR:repeat:link down", "INFO:repeat:info", "INFO:repeat:info"]
+    assert log._repeats["link down"][1] == 2
+
+
+def test_exc_into_sink(monkeypatch):
+    # traceback follows its header through the ring sink, nothing written directly
+    log, stream = make(monkeypatch, "exc")
+    sink = logging.RingSink(4096, stream)
+    monkeypatch.setattr(logging, "_sink", sink)
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        log.exc(e, "failed: %s", 1)
+    assert stream.getvalue() == ""
+    out = bytes(sink.buf[:sink.used]).decode()
+    assert out.startswith("ERROR:exc:failed: 1\n")
+    assert "ValueError: boom" in out
@@ -0,0 +1,52 @@
+from scrivo_meter import _runner
+from scrivo_meter.crc import put_crc16
+
+
+def frame(*data):
+    buf = bytearray(len(data) + 2)
+    buf[:len(data)] = bytes(data)
+    put_crc16(buf, len(data))
+    return bytes(buf)
+
+
+def make():
+    runner = _runner.Runner.__new__(_runner.Runner)
+    runner.panel_slave_addr = [1]
+    runner.panel_cache_init()
+    return runner
+
+
+def exc(func, code):
+    return frame(0x01, func | 0x80, code)
+
+
+def test_write_multiple_illegal_function():
+    runner = make()
+    fc16 = frame(0x01, 0x10, 0x00, 0x0e, 0x00, 0x01, 0x02, 0x00, 0x05)
+    fc15 = frame(0x01, 0x0f, 0x00, 0x00, 0x00, 0x0a, 0x02, 0xff, 0x03)
+    assert bytes(runner.panel_request_decode(fc16)) == exc(0x10, 0x01)
+    assert bytes(runner.panel_request_decode(fc15)) == exc(0x0f, 0x01)
+    assert bytes(runner.panel_request_decode(frame(0x01, 0x06, 0x00, 0x0e, 0x00, 0x01))) == exc(0x06, 0x01)
+
+
+def test_other_unit_no_reply():
+    runner = make()
+    assert runner.panel_request_decode(frame(0x02, 0x10, 0x00, 0x0e, 0x00, 0x01, 0x02, 0x00, 0x05)) is None
+
+
+def test_emulated_and_unknown():
+    runner = make()
+    assert bytes(runner.panel_request_decode(frame(0x01, 0x03, 0x00, 0x0b, 0x00, 0x01))) == frame(0x01, 0x03, 0x02, 0x00, 0x00)
+    assert bytes(runner.panel_request_decode(frame(0x01, 0x03, 0x00, 0x30, 0x00, 0x01))) == exc(0x03, 0x02)
+
+
+def test_image_stale_policy(monkeypatch):
+    # part of a configured range, not fresh: exception code of that register
+    request = frame(0x01, 0x03, 0x20, 0x00, 0x00, 0x03)
+    assert bytes(make().panel_request_decode(request)) == exc(0x03, _runner.panel_exc_stale)
+
+    monkeypatch.setitem(_runner.data_register_slave[48193], "stale", None)
+    assert make().panel_request_decode(request) is None
+
+    monkeypatch.setitem(_runner.data_register_slave[48193], "stale", 0x04)
+    assert bytes(make().panel_request_decode(request)) == exc(0x03, 0x04)
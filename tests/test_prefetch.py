@@ -0,0 +1,60 @@
+import asyncio
+
+import aioespnow
+
+from scrivo_meter_server import _runner
+from scrivo_meter_server.demand import unpack_trigger
+
+
+def make():
+    runner = _runner.Runner.__new__(_runner.Runner)
+    runner.e_lan = aioespnow.AIOESPNow()
+    runner.panel_slave_addr = [1]
+    runner.panel_cache_init()
+    return runner
+
+
+def triggers(interval, lead, run_ms):
+    # inverter reads one record every interval ms, client round trip learned as lead
+    async def main():
+        runner = make()
+        data_master = _runner.data_register_master[48193]
+        data_master["lead"] = lead
+
+        async def inverter():
+            while True:
+                data_master["demand"].hit()
+                await asyncio.sleep(interval / 1000)
+
+        # read rate learned before prefetch starts
+        tasks = [asyncio.create_task(inverter())]
+        await asyncio.sleep(1.5 * interval / 1000)
+        tasks.append(asyncio.create_task(runner.espnow_prefetch()))
+        await asyncio.sleep(run_ms / 1000)
+        for task in tasks:
+            task.cancel()
+        return [unpack_trigger(msg) for peer, msg in runner.e_lan.sent]
+
+    return asyncio.run(main())
+
+
+def test_one_trigger_per_read():
+    sent = triggers(100, 30, 1000)
+    assert set(sent) == {48193}
+    assert 7 <= len(sent) <= 11
+
+
+def test_lead_longer_than_interval():
+    # no flood when the lead is longer than the read interval
+    assert len(triggers(300, 400, 1000)) <= 1000 // 300 + 1
+    assert len(triggers(100, 150, 1000)) <= 1000 // 100 + 1
+
+
+def test_lead_capped():
+    runner = make()
+    data_master = _runner.data_register_master[48193]
+    data_master["demand"].interval = 300
+    data_master["trigger"] = _runner.time.ticks_add(_runner.time.ticks_ms(), -5000)
+    runner.meter_record(bytes(12), 48193, 0, 0, 12, 1)
+    assert data_master["lead"] == 300
+    assert data_master["trigger"] is None
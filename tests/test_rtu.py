@@ -0,0 +1,219 @@
+import asyncio
+import time
+
+from machine import UART
+
+from scrivo_meter.crc import check_crc16, put_crc16
+from scrivo_meter.rtu import RtuFramer, RtuStream, request_len, response_len
+
+
+def frame(*data):
+    buf = bytearray(len(data) + 2)
+    buf[:len(data)] = bytes(data)
+    put_crc16(buf, len(data))
+    return bytes(buf)
+
+
+READ = frame(0x01, 0x03, 0x00, 0x00, 0x00, 0x02)
+REPLY = frame(0x01, 0x03, 0x04, 0x00, 0x01, 0x00, 0x02)
+EXC = frame(0x01, 0x83, 0x02)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def later(ms, f, *args):
+    asyncio.get_running_loop().call_later(ms / 1000, f, *args)
+
+
+def test_lengths():
+    assert request_len(READ, 0, len(READ)) == 8
+    assert request_len(READ, 0, 1) == -1
+    assert request_len(b"\x01\x10\x00\x00\x00\x02", 0, 6) == -1
+    assert request_len(b"\x01\x10\x00\x00\x00\x02\x04", 0, 7) == 13
+    assert request_len(b"\x01\x2b", 0, 2) == 0
+    assert response_len(0x03, 2) == 9
+    assert response_len(0x01, 9) == 7
+
+
+def test_gap_framing():
+    # second frame after silence is left for the next read
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart, irq=False)
+        uart.feed(REPLY)
+        later(30, uart.feed, READ)
+        first = bytes(await framer.read(timeout_ms=200))
+        second = bytes(await framer.read(timeout_ms=200))
+        return first, second
+
+    first, second = run(main())
+    assert first == REPLY
+    assert second == READ
+
+
+def test_gap_framing_irq():
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart)
+        assert framer.flag is not None
+        later(5, uart.feed, REPLY)
+        return bytes(await framer.read(timeout_ms=200))
+
+    assert run(main()) == REPLY
+
+
+def test_expected_early_return():
+    # read returns at expected length, without waiting for the silence gap
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart, baudrate=1200, irq=False)
+        uart.feed(REPLY + b"\x55")
+        start = time.ticks_ms()
+        data = bytes(await framer.read(expected=len(REPLY), timeout_ms=500))
+        return data, time.ticks_diff(time.ticks_ms(), start), uart.any()
+
+    data, took, left = run(main())
+    assert data == REPLY
+    assert took < framer_gap_ms(1200)
+    assert left == 1
+
+
+def framer_gap_ms(baudrate):
+    return RtuFramer(UART(), baudrate=baudrate, irq=False).gap_ms
+
+
+def test_exception_shortening():
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart, irq=False)
+        later(5, uart.feed, EXC)
+        start = time.ticks_ms()
+        data = bytes(await framer.read(expected=len(REPLY), timeout_ms=500))
+        return data, time.ticks_diff(time.ticks_ms(), start)
+
+    data, took = run(main())
+    assert data == EXC
+    assert took < 400
+
+
+def test_timeout_nothing():
+    async def main():
+        framer = RtuFramer(UART(), irq=False)
+        return bytes(await framer.read(expected=9, timeout_ms=20))
+
+    assert run(main()) == b""
+
+
+def test_stream_split():
+    stream = RtuStream()
+    stream.feed(READ[:3])
+    assert stream.pop() is None
+    stream.feed(READ[3:])
+    assert bytes(stream.pop()) == READ
+    assert stream.pop() is None
+    assert stream.skipped == 0
+
+
+def test_stream_joined():
+    other = frame(0x02, 0x04, 0x00, 0x10, 0x00, 0x01)
+    stream = RtuStream()
+    stream.feed(READ + other)
+    assert bytes(stream.pop()) == READ
+    assert bytes(stream.pop()) == other
+    assert stream.pop() is None
+
+
+def test_stream_noise():
+    stream = RtuStream()
+    stream.feed(b"\x00\xff\x01" + READ)
+    assert bytes(stream.pop()) == READ
+    assert stream.skipped == 3
+
+
+def test_stream_reset():
+    stream = RtuStream()
+    stream.feed(READ[:5])
+    assert stream.pop() is None
+    stream.reset()
+    assert stream.skipped == 5
+    stream.feed(READ)
+    assert bytes(stream.pop()) == READ
+
+
+def test_crc():
+    assert check_crc16(READ)
+    assert not check_crc16(READ[:-1] + bytes([READ[-1] ^ 1]))
+
+
+def test_timeout_partial():
+    # bytes of an expected frame cut by timeout are no answer
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart, irq=False)
+        uart.feed(REPLY[:4])
+        return bytes(await framer.read(expected=len(REPLY), timeout_ms=20))
+
+    assert run(main()) == b""
+
+
+def test_timeout_partial_exception():
+    async def main():
+        uart = UART()
+        framer = RtuFramer(uart, irq=False)
+        uart.feed(EXC[:3])
+        return bytes(await framer.read(expected=len(REPLY), timeout_ms=20))
+
+    assert run(main()) == b""
+
+
+def test_request_len_rejects_bad_count():
+    assert request_len(b"\x55\x10\x00\x00\x00\x00\xf0", 0, 7) == 0
+    assert request_len(b"\x01\x10\x00\x00\x00\x02\x05", 0, 7) == 0
+    assert request_len(b"\x01\x0f\x00\x00\x00\x0a\x02", 0, 7) == 11
+    assert request_len(b"\x01\x10\x00\x00\x00\x7c\xf8", 0, 7) == 0
+
+
+def test_stream_long_noise():
+    # noise looking like a write multiple header does not stall the stream
+    stream = RtuStream()
+    stream.feed(b"\x55\x10\x00\x00\x00\x00\xf0" + READ)
+    assert bytes(stream.pop()) == READ
+    assert stream.skipped == 7
+
+
+def test_stream_past_partial_candidate():
+    # consistent header of a long frame that never completes
+    write = frame(0x01, 0x10, 0x00, 0x00, 0x00, 0x60, 0xc0, *range(0xc0))
+    stream = RtuStream()
+    stream.feed(write[:20] + READ)
+    assert bytes(stream.pop()) == READ
+    assert stream.skipped == 20
+    assert stream.pop() is None
+
+
+def test_stream_keeps_partial_frame():
+    write = frame(0x01, 0x10, 0x00, 0x00, 0x00, 0x02, 0x04, 0x00, 0x01, 0x00, 0x02)
+    stream = RtuStream()
+    stream.feed(READ + write[:9])
+    assert bytes(stream.pop()) == READ
+    assert stream.pop() is None
+    stream.feed(write[9:])
+    assert bytes(stream.pop()) == write
+    assert stream.skipped == 0
+
+
+def test_stream_addrs():
+    other = frame(0x02, 0x03, 0x00, 0x00, 0x00, 0x02)
+    stream = RtuStream(addrs=[1])
+    # complete frames to other units still pop, partial ones are not waited for
+    stream.feed(other)
+    assert bytes(stream.pop()) == other
+    stream.feed(other[:5])
+    assert stream.pop() is None
+    assert stream.skipped == 5
+    stream.feed(READ[:5])
+    assert stream.pop() is None
+    stream.feed(READ[5:])
+    assert bytes(stream.pop()) == READ
@@ -0,0 +1,36 @@
+import ast
+
+from strip_debug import strip_source
+
+
+def strip(source):
+    out, count = strip_source(source)
+    ast.parse(out)
+    return out, count
+
+
+def test_statement():
+    out, count = strip("def f(x):\n    log.debug('x %s', x)\n    return x\n")
+    assert count == 1
+    assert out == "def f(x):\n    pass\n    return x\n"
+
+
+def test_multiline_call():
+    out, count = strip("if x:\n    log.debug(\n        'a %s',\n        x)\ny = 1\n")
+    assert out == "if x:\n    pass\ny = 1\n"
+
+
+def test_one_line_compound():
+    out, count = strip("if x: log.debug('a')\nelse:\n    y = 1\n")
+    assert out == "if x: pass\nelse:\n    y = 1\n"
+
+
+def test_same_line_statements():
+    out, count = strip("y = 'é'; log.debug('a'); log.debug('b'); z = 1\n")
+    assert count == 2
+    assert out == "y = 'é'; pass; pass; z = 1\n"
+
+
+def test_other_logger_kept():
+    source = "other.debug('a')\nlog.info('b')\n"
+    assert strip(source) == (source, 0)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Production build: copy a board tree and strip log.debug() calls.
+
+    python3 tools/strip_debug.py solo/esp32_meter build/esp32_meter
+    python3 tools/strip_debug.py --mpy espnow/solax_chint_1p/meter_server build/meter_server
+
+Each debug call is replaced by `pass` in place, so blocks stay valid.
+With --mpy every module except boot.py/main.py is compiled by mpy-cross.
+"""
+
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+
+KEEP_PY = ("boot.py", "main.py")
+
+
+def is_debug_call(node, names):
+    if not isinstance(node, ast.Expr) or not isinstance(node.value, ast.Call):
+        return False
+    func = node.value.func
+    return (isinstance(func, ast.Attribute) and func.attr == "debug"
+            and isinstance(func.value, ast.Name) and func.value.id in names)
+
+
+def strip_source(source, names=("log",)):
+    # ast column offsets are utf-8 byte offsets
+    lines = source.encode().splitlines(keepends=True)
+    calls = [node for node in ast.walk(ast.parse(source)) if is_debug_call(node, names)]
+
+    # only the call span, code before and after on the same lines stays
+    for node in sorted(calls, key=lambda n: (n.lineno, n.col_offset), reverse=True):
+        first = node.lineno - 1
+        last = node.end_lineno - 1
+        lines[first:last + 1] = [lines[first][:node.col_offset] + b"pass" + lines[last][node.end_col_offset:]]
+
+    return b"".join(lines).decode(), len(calls)
+
+
+def build(src, dst, mpy=False, names=("log",)):
+    total = 0
+    for root, dirs, files in os.walk(src):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        out_dir = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(out_dir, exist_ok=True)
+
+        for name in files:
+            src_file = os.path.join(root, name)
+            out_file = os.path.join(out_dir, name)
+            if not name.endswith(".py"):
+                shutil.copyfile(src_file, out_file)
+                continue
+
+            with open(src_file) as f:
+                source, count = strip_source(f.read(), names)
+            total += count
+            with open(out_file, "w") as f:
+                f.write(source)
+
+            if mpy and name not in KEEP_PY:
+                subprocess.check_call(["mpy-cross", out_file])
+                os.remove(out_file)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("src", help="board tree, e.g. solo/esp32_meter")
+    parser.add_argument("dst", help="output directory")
+    parser.add_argument("--mpy", action="store_true", help="compile modules with mpy-cross")
+    parser.add_argument("--logger", action="append", default=["log"], help="logger variable names")
+    args = parser.parse_args()
+
+    count = build(args.src, args.dst, args.mpy, tuple(args.logger))
+    print("stripped {} debug calls: {} -> {}".format(count, args.src, args.dst))
+
+
+if __name__ == "__main__":
+    sys.exit(main())